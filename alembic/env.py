@@ -32,7 +32,7 @@ def run_migrations_offline():
     Calls context.execute() here emit the given string to the
     script output.
     """
-    url = settings.SQLALCHEMY_DATABASE_URI
+    url = settings.sqlalchemy_database_url
     context.configure(
         url=url,
         target_metadata=target_metadata,
@@ -56,7 +56,7 @@ async def run_migrations_async() -> None:
 
     """
     configuration = config.get_section(config.config_ini_section)
-    configuration["sqlalchemy.url"] = settings.SQLALCHEMY_DATABASE_URI
+    configuration["sqlalchemy.url"] = settings.sqlalchemy_database_url
     connectable = async_engine_from_config(
         configuration,
         prefix="sqlalchemy.",
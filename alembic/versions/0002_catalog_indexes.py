@@ -0,0 +1,46 @@
+"""catalog filtering and sorting indexes
+
+Revision ID: 0002_catalog_indexes
+Revises: 0001_book_search
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_catalog_indexes'
+down_revision = '0001_book_search'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS ix_books_price_id ON books (price, id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_books_title_id ON books (title, id)")
+    # === (title, id) serves every lookup the single column index did ===
+    op.execute("DROP INDEX IF EXISTS ix_books_title")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_books_in_stock_created_at_id "
+        "ON books (created_at, id) "
+        "WHERE stock_quantity > 0"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_books_in_stock_price_id "
+        "ON books (price, id) "
+        "WHERE stock_quantity > 0"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_books_in_stock_title_id "
+        "ON books (title, id) "
+        "WHERE stock_quantity > 0"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_books_in_stock_title_id")
+    op.execute("DROP INDEX IF EXISTS ix_books_in_stock_price_id")
+    op.execute("DROP INDEX IF EXISTS ix_books_in_stock_created_at_id")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_books_title ON books (title)")
+    op.execute("DROP INDEX IF EXISTS ix_books_title_id")
+    op.execute("DROP INDEX IF EXISTS ix_books_price_id")
@@ -0,0 +1,25 @@
+"""books.image_url is optional
+
+Revision ID: 0003_book_image_url_nullable
+Revises: 0002_catalog_indexes
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_book_image_url_nullable'
+down_revision = '0002_catalog_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.alter_column("books", "image_url", existing_type=sa.String(500), nullable=True)
+
+
+def downgrade() -> None:
+    op.execute("UPDATE books SET image_url = '' WHERE image_url IS NULL")
+    op.alter_column("books", "image_url", existing_type=sa.String(500), nullable=False)
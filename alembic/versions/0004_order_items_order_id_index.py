@@ -0,0 +1,25 @@
+"""index order items by order
+
+Revision ID: 0004_order_items_order_id_index
+Revises: 0003_book_image_url_nullable
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_order_items_order_id_index'
+down_revision = '0003_book_image_url_nullable'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_order_items_order_id")
@@ -0,0 +1,58 @@
+"""payment attempts processed by the payment workers
+
+Revision ID: 0005_payment_attempts
+Revises: 0004_order_items_order_id_index
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_payment_attempts'
+down_revision = '0004_order_items_order_id_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # === The table may already exist from create_all on startup ===
+    op.execute(
+        """
+        DO $$ BEGIN
+            CREATE TYPE paymentstatus
+                AS ENUM ('QUEUED', 'PROCESSING', 'SUCCEEDED', 'FAILED');
+        EXCEPTION WHEN duplicate_object THEN NULL;
+        END $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS payment_attempts (
+            id SERIAL PRIMARY KEY,
+            order_id INTEGER NOT NULL REFERENCES orders (id),
+            status paymentstatus NOT NULL,
+            message VARCHAR(255),
+            transaction_id VARCHAR(64),
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            updated_at TIMESTAMP WITHOUT TIME ZONE
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_payment_attempts_id ON payment_attempts (id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_payment_attempts_order_id "
+        "ON payment_attempts (order_id)"
+    )
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_payment_attempts_in_flight_order_id "
+        "ON payment_attempts (order_id) "
+        "WHERE status IN ('QUEUED', 'PROCESSING')"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS payment_attempts")
+    op.execute("DROP TYPE IF EXISTS paymentstatus")
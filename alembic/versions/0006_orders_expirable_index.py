@@ -0,0 +1,27 @@
+"""partial index of orders the expiry sweeper may cancel
+
+Revision ID: 0006_orders_expirable_index
+Revises: 0005_payment_attempts
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_orders_expirable_index'
+down_revision = '0005_payment_attempts'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_orders_expirable_created_at "
+        "ON orders (created_at) "
+        "WHERE status IN ('PENDING', 'FAILED')"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_orders_expirable_created_at")
@@ -0,0 +1,24 @@
+"""refund_pending status of payment attempts charged but not applied
+
+Revision ID: 0007_payment_refund_pending
+Revises: 0006_orders_expirable_index
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_payment_refund_pending'
+down_revision = '0006_orders_expirable_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TYPE paymentstatus ADD VALUE IF NOT EXISTS 'REFUND_PENDING'")
+
+
+def downgrade() -> None:
+    # === Postgres can't drop a value from an enum type, it stays unused ===
+    pass
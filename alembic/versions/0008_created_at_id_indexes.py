@@ -0,0 +1,32 @@
+"""(created_at, id) indexes behind the keyset paging of books, orders and users
+
+Revision ID: 0008_created_at_id_indexes
+Revises: 0007_payment_refund_pending
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_created_at_id_indexes'
+down_revision = '0007_payment_refund_pending'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_books_created_at_id": "books (created_at, id)",
+    "ix_orders_created_at_id": "orders (created_at, id)",
+    "ix_orders_user_id_created_at_id": "orders (user_id, created_at, id)",
+    "ix_users_created_at_id": "users (created_at, id)",
+}
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
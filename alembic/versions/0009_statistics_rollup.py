@@ -0,0 +1,46 @@
+"""stat_counters and book_sales tables of the admin statistics rollup
+
+Fill them with `python -m app.cli.rebuild_statistics`
+after upgrading a database that already has orders.
+
+Revision ID: 0009_statistics_rollup
+Revises: 0008_created_at_id_indexes
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_statistics_rollup'
+down_revision = '0008_created_at_id_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # === The tables may already exist from create_all on startup ===
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stat_counters (
+            key VARCHAR(64) PRIMARY KEY,
+            value NUMERIC(14, 2) NOT NULL
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS book_sales (
+            book_id INTEGER PRIMARY KEY REFERENCES books (id),
+            total_sold INTEGER NOT NULL
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_book_sales_total_sold ON book_sales (total_sold)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS book_sales")
+    op.execute("DROP TABLE IF EXISTS stat_counters")
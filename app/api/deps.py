@@ -1,21 +1,31 @@
+from decimal import Decimal
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple, Type
+
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Query, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import BaseModel
 
 from app.models import User
+from app.schemas import BookFilter, BookSort, Principal
 from app.database import get_db
+from app.services import BookService, UserService
+from app.core.principal import principal_cache
 from app.core.security import verify_access_token
+from app.utils.pagination import Keyset, RankKeyset, decode_cursor, decode_rank_cursor
+from app.utils.fields import allowed_fields, parse_fields
 
 
 security = HTTPBearer()
 
 
-async def get_current_user(
+async def get_current_principal(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db),
-) -> User:
-    """Get a current authenticated user."""
+) -> Principal:
+    """Get the authenticated caller, from the principal cache when possible."""
     token = credentials.credentials
 
     username = verify_access_token(token)
@@ -26,34 +36,61 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # === Get the user from DB ===
-    result = await db.execute(
-        select(User).where(User.username == username)
-    )
-    user = result.scalar_one_or_none()
-
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
+    principal = principal_cache.get(username)
+    if principal is None:
+        # === Get only the auth fields from DB, no relationships ===
+        result = await db.execute(
+            select(
+                User.id,
+                User.username,
+                User.is_active,
+                User.is_superuser,
+                User.is_banned,
+            ).where(User.username == username)
         )
+        row = result.one_or_none()
+
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found",
+            )
+
+        principal = Principal.model_validate(row)
+        principal_cache.set(username, principal)
 
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Inactive user",
         )
 
-    if user.is_banned:
+    if principal.is_banned:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You are banned, Contact Help Center!",
         )
+    return principal
+
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """
+    Get a current authenticated user with all
+    fields, for endpoints that show or change it.
+    """
+    user = await UserService.get(db, principal.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
     return user
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_principal),
+) -> Principal:
     """Get current active user."""
     if not current_user.is_active:
         raise HTTPException(
@@ -63,13 +100,138 @@ async def get_current_active_user(
     return current_user
 
 async def get_current_active_superuser(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_principal),
+) -> Principal:
     """Get current active superuser."""
-    if not current_user.is_active:
+    if not current_user.is_active or not current_user.is_superuser:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
+            status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions",
         )
     return current_user
 
+
+def get_idempotency_key(
+    idempotency_key: Optional[str] = Header(
+        None,
+        alias="Idempotency-Key",
+        min_length=1,
+        max_length=255,
+        description=(
+            "Unique per operation, "
+            "retries with the same key get the first response again"
+        ),
+    ),
+) -> Optional[str]:
+    """Get the Idempotency-Key of a write, when the client sent one."""
+    return idempotency_key
+
+
+def get_page_cursor(
+    cursor: Optional[str] = Query(
+        None, description="Opaque cursor from `next_cursor` of the previous page"
+    ),
+) -> Optional[Keyset]:
+    """Get the keyset to continue from, when a page cursor is given."""
+    if cursor is None:
+        return None
+
+    after = decode_cursor(cursor)
+    if after is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    return after
+
+
+def get_book_filter(
+    min_price: Optional[Decimal] = Query(None, ge=0),
+    max_price: Optional[Decimal] = Query(None, ge=0),
+    in_stock: bool = Query(False, description="Only books with stock left"),
+    created_after: Optional[datetime] = Query(None),
+    sort: BookSort = Query(BookSort.NEWEST),
+) -> BookFilter:
+    """Get the catalog filter and sort order from query parameters."""
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_price can't be greater than max_price",
+        )
+    return BookFilter(
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        created_after=created_after,
+        sort=sort,
+    )
+
+
+def get_book_cursor(
+    cursor: Optional[str] = Query(
+        None, description="Opaque cursor from `next_cursor` of the previous page"
+    ),
+    book_filter: BookFilter = Depends(get_book_filter),
+) -> Optional[Tuple[Any, int]]:
+    """
+    Get the keyset to continue the catalog from, in
+    its sort order, when a page cursor is given.
+    """
+    if cursor is None:
+        return None
+
+    after = BookService.decode_cursor(book_filter.sort, cursor)
+    if after is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    return after
+
+
+def get_search_cursor(
+    cursor: Optional[str] = Query(
+        None, description="Opaque cursor from `next_cursor` of the previous page"
+    ),
+) -> Optional[RankKeyset]:
+    """Get the rank keyset to continue a search from, when a page cursor is given."""
+    if cursor is None:
+        return None
+
+    after = decode_rank_cursor(cursor)
+    if after is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    return after
+
+
+def get_sparse_fields(
+    schema: Type[BaseModel], model: Any
+) -> Callable[..., Optional[List[str]]]:
+    """
+    Make a dependency parsing `fields=` into the
+    schema fields a list endpoint should return.
+    """
+    allowed = allowed_fields(schema, model)
+
+    def dependency(
+        fields: Optional[str] = Query(
+            None,
+            description=(
+                f"Comma separated fields to return, any of: {', '.join(allowed)}"
+            ),
+        ),
+    ) -> Optional[List[str]]:
+        if fields is None:
+            return None
+        try:
+            return parse_fields(fields, allowed)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e),
+            )
+
+    return dependency
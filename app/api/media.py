@@ -0,0 +1,63 @@
+import os
+from typing import Dict
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request, Response, status
+
+from app.config import settings
+from app.core import media_key, media_path
+from app.utils.etag import etag_matches, make_etag
+from app.utils.files import RangeFileResponse, parse_range
+
+router = APIRouter()
+
+
+def media_headers(etag: str) -> Dict[str, str]:
+    """
+    Get caching headers of a stored file, its name
+    changes with its content so it never goes stale
+    """
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable",
+    }
+
+
+@router.api_route("/{name:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def read_media(name: str, request: Request) -> Response:
+    """
+    Serve an uploaded image or one of its variants, with 304s and byte ranges.
+    Only content addressed names are served, so
+    nothing outside UPLOAD_DIR can be reached.
+    """
+    key = media_key(name)
+    if key is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    path = media_path(name)
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    # === The content hash is the strong ETag ===
+    etag = make_etag(key)
+    headers = media_headers(etag)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # === If-Range needs a strong match, anything else gets the whole file ===
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, stat_result.st_size)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Range not satisfiable",
+                headers={"Content-Range": f"bytes */{stat_result.st_size}"},
+            )
+
+    return RangeFileResponse(path, stat_result, headers=headers, byte_range=byte_range)
@@ -1,61 +1,102 @@
-from typing import Any, Dict, List, Sequence
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
 
-from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-
-from app.database import get_db
-from app.schemas import OrderList, User
-from app.models import User as UserModel
-from app.services import OrderService, UserService
-from app.api.deps import get_current_active_superuser
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from app.database import (
+    engine,
+    get_db,
+    pool_stats,
+    read_session_factory,
+    replica_engine,
+)
+from app.schemas import Order, OrderExportFormat, OrderList, Principal, User
+from app.models import Order as OrderModel, OrderStatus, User as UserModel
+from app.services import CountService, OrderService, StatisticsService, UserService
+from app.services.order import EXPORT_COLUMNS
+from app.services.book import book_cache
+from app.services.count import count_cache
+from app.core.idempotency import idempotency_cache
+from app.core.principal import principal_cache
+from app.core.security import token_cache
+from app.utils.fields import sparse_response
+from app.utils.responses import render
+from app.utils.records import encode_csv_rows, encode_ndjson_rows
+from app.utils.pagination import Keyset, split_page
+from app.api.deps import (
+    get_current_active_superuser,
+    get_page_cursor,
+    get_sparse_fields,
+)
 
 router = APIRouter()
 
 
 @router.get("/statistics", response_model=Dict[str, Any])
-async def get_statistics(db: AsyncSession = Depends(get_db)) -> Dict[str, Any]:
-    """Get admin statistics"""
-    # === Get order stats ===
-    order_stats = await OrderService.get_statistics(db=db)
-
-    # === Get user stats ===
-    total_users_result = await db.execute(
-        select(func.count(UserModel.id))
-    )
-    total_users = total_users_result.scalar_one()
-
-    active_users_result = await db.execute(
-        select(func.count(UserModel.id)).where(UserModel.is_active == True)
-    )
-    active_users = active_users_result.scalar_one()
-
-    banned_users_result = await db.execute(
-        select(func.count(UserModel.id)).where(UserModel.is_banned == True)
-    )
-    banned_users = banned_users_result.scalar_one()
-
+async def get_statistics(request: Request) -> Dict[str, Any]:
+    """
+    Get admin statistics from the incrementally
+    maintained rollup, on the read replica when possible
+    """
+    return await StatisticsService.read(session_factory=read_session_factory(request))
+
+
+@router.get("/cache", response_model=Dict[str, Dict[str, int]])
+async def get_cache_stats(
+    current_user: Principal = Depends(get_current_active_superuser),
+) -> Dict[str, Dict[str, int]]:
+    """Get hit/miss/eviction counters of in-process caches (admin only)"""
     return {
-        "users": {
-            "total": total_users,
-            "active": active_users,
-            "banned": banned_users,
-        },
-        "orders": order_stats
+        "books": book_cache.stats(),
+        "counts": count_cache.stats(),
+        "principals": principal_cache.stats(),
+        "tokens": token_cache.stats(),
+        "idempotency": idempotency_cache.stats(),
     }
 
 
+@router.get("/pool", response_model=Dict[str, Dict[str, Union[int, float]]])
+async def get_pool_stats(
+    current_user: Principal = Depends(get_current_active_superuser),
+) -> Dict[str, Dict[str, Union[int, float]]]:
+    """
+    Get occupancy, wait time and timeouts of database connection pools (admin only)
+    """
+    pools = {"primary": pool_stats(engine)}
+    if replica_engine is not None:
+        pools["replica"] = pool_stats(replica_engine)
+    return pools
+
+
 @router.get("/users", response_model=List[User])
 async def get_users(
+    response: Response,
     db: AsyncSession = Depends(get_db),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
-) -> Sequence[User]:
-    """Get all users (admin only)"""
-    result = await db.execute(
-        select(UserModel).offset(skip).limit(limit).order_by(UserModel.created_at.desc())
+    after: Optional[Keyset] = Depends(get_page_cursor),
+    fields: Optional[List[str]] = Depends(get_sparse_fields(User, UserModel)),
+) -> Any:
+    """
+    Get all users (admin only), cursor of the next page is sent in X-Next-Cursor header
+    """
+    users = await UserService.get_multi(
+        db, skip=skip, limit=limit + 1, after=after, fields=fields
     )
-    users = result.scalars().all()
+    users, next_cursor = split_page(users, limit)
+
+    if fields:
+        # === A returned response doesn't pick up headers set on the injected one ===
+        response = sparse_response(User, fields, users)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return users
 
 
@@ -97,7 +138,7 @@ async def admin_ban_user(
 async def admin_unban_user(
     user_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_superuser),
+    current_user: Principal = Depends(get_current_active_superuser),
 ) -> Any:
     """Unban user (admin only)"""
     user = await UserService.get(db, user_id)
@@ -120,18 +161,75 @@ async def get_all_orders(
     db: AsyncSession = Depends(get_db),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    after: Optional[Keyset] = Depends(get_page_cursor),
+    fields: Optional[List[str]] = Depends(get_sparse_fields(Order, OrderModel)),
 ) -> Any:
-    """Get all orders"""
-    orders = await OrderService.get_all_orders(db=db, skip=skip, limit=limit)
-    total = await OrderService.get_total_count(db)
+    """
+    Get all orders, paged by skip/limit or by cursor, optionally with only some `fields`
+    """
+    orders = await OrderService.get_all_orders(
+        db=db, skip=skip, limit=limit + 1, after=after, fields=fields
+    )
+    orders, next_cursor = split_page(orders, limit)
+    total, total_exact = await CountService.get_total(
+        db,
+        settings.ADMIN_ORDERS_COUNT_MODE,
+        ("orders",),
+        lambda: OrderService.get_total_count(db),
+    )
 
-    return {
+    content = {
         "orders": orders,
         "total": total,
+        "total_exact": total_exact,
         "page": skip // limit + 1,
         "per_page": limit,
         "pages": (total + limit - 1) // limit,
+        "next_cursor": next_cursor,
     }
-
-
-
+    if fields:
+        return sparse_response(
+            Order, fields, content, list_schema=OrderList, items_key="orders"
+        )
+    return render(OrderList, content)
+
+
+@router.get("/orders/export")
+async def export_orders(
+    request: Request,
+    fmt: OrderExportFormat = Query(OrderExportFormat.CSV, alias="format"),
+    order_status: Optional[OrderStatus] = Query(None, alias="status"),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
+    current_user: Principal = Depends(get_current_active_superuser),
+) -> StreamingResponse:
+    """
+    Export orders as CSV or NDJSON, one row per order item, oldest first (admin only).
+    The export is streamed from a server-side cursor, whatever its size.
+    """
+    columns = [name for name, _ in EXPORT_COLUMNS]
+    session_factory = read_session_factory(request)
+
+    # === The stream outlives the request's ===
+    # === dependencies, so it opens its own session ===
+    async def body() -> AsyncIterator[bytes]:
+        if fmt == OrderExportFormat.CSV:
+            yield encode_csv_rows([columns])
+        async with session_factory() as db:
+            async for rows in OrderService.stream_export(
+                db,
+                status=order_status,
+                created_after=created_after,
+                created_before=created_before,
+            ):
+                if fmt == OrderExportFormat.CSV:
+                    yield encode_csv_rows(rows)
+                else:
+                    yield encode_ndjson_rows(columns, rows)
+
+    media_type = "text/csv" if fmt == OrderExportFormat.CSV else "application/x-ndjson"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders.{fmt.value}"'},
+    )
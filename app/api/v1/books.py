@@ -1,52 +1,183 @@
-from typing import Any
+from typing import Any, List, Optional, Tuple
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
 
-from app.models import User
-from app.database import get_db
-from app.services import BookService
-from app.api.deps import get_current_active_superuser
-from app.schemas import Book, BookCreate, BookUpdate, BookList
+from app.config import settings
+from app.core import (
+    UnsupportedImage,
+    UploadTooLarge,
+    media_url,
+    render_variants,
+    store_upload,
+    variant_names,
+)
+from app.models import Book as BookModel
+from app.database import get_db, get_read_db
+from app.services import BookImportService, BookService, CountService
+from app.utils.fields import sparse_response
+from app.utils.responses import render
+from app.utils.etag import etag_matches, make_etag, not_modified, with_cache_headers
+from app.utils.pagination import RankKeyset, encode_rank_cursor, split_page
+from app.api.deps import (
+    get_book_cursor,
+    get_book_filter,
+    get_current_active_superuser,
+    get_search_cursor,
+    get_sparse_fields,
+)
+from app.schemas import (
+    Book,
+    BookCreate,
+    BookFilter,
+    BookImage,
+    BookImportFormat,
+    BookImportResult,
+    BookList,
+    BookSearchResults,
+    BookUpdate,
+    Principal,
+)
 
 router = APIRouter()
 
 
 @router.get("/", response_model=BookList)
 async def list_books(
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    book_filter: BookFilter = Depends(get_book_filter),
+    after: Optional[Tuple[Any, int]] = Depends(get_book_cursor),
+    fields: Optional[List[str]] = Depends(get_sparse_fields(Book, BookModel)),
 ) -> Any:
-    """Get a list of books"""
-    books = await BookService.get_multi(db=db, skip=skip, limit=limit)
-    total = await BookService.get_total_count(db=db)
+    """
+    Get a list of books, filtered by price, stock
+    and creation date and sorted by `sort`,
+    paged by skip/limit or by cursor, optionally with only some `fields`.
+    The ETag follows the catalog and stock versions, so
+    unchanged pages are answered with 304 before querying them.
+    """
+    etag = make_etag("books", *await BookService.get_catalog_version(db))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
 
-    return {
+    # === Fetch one extra row to know if there is a next page ===
+    books = await BookService.get_multi(
+        db=db,
+        skip=skip,
+        limit=limit + 1,
+        after=after,
+        fields=fields,
+        book_filter=book_filter,
+    )
+    books, next_cursor = split_page(
+        books, limit, lambda book: BookService.encode_cursor(book_filter.sort, book)
+    )
+
+    # === Totals are cached per filter, the sort order doesn't change them ===
+    count_key: Tuple[Any, ...] = ("books",)
+    if book_filter.is_filtered():
+        count_key += (
+            book_filter.min_price,
+            book_filter.max_price,
+            book_filter.in_stock,
+            book_filter.created_after,
+        )
+    total, total_exact = await CountService.get_total(
+        db,
+        settings.BOOKS_COUNT_MODE,
+        count_key,
+        lambda: BookService.get_total_count(db=db, book_filter=book_filter),
+    )
+
+    content = {
         "books": books,
         "total": total,
+        "total_exact": total_exact,
         "page": skip // limit + 1,
         "per_page": limit,
-        "pages": (total + limit - 1) // limit
+        "pages": (total + limit - 1) // limit,
+        "next_cursor": next_cursor,
     }
+    if fields:
+        return with_cache_headers(
+            sparse_response(
+                Book, fields, content, list_schema=BookList, items_key="books"
+            ),
+            response,
+            etag,
+        )
+    return with_cache_headers(render(BookList, content), response, etag)
+
+
+@router.get("/search", response_model=BookSearchResults)
+async def search_books(
+    request: Request,
+    response: Response,
+    q: str = Query(
+        ...,
+        min_length=1,
+        max_length=200,
+        description="Words to look for, typos are tolerated in titles",
+    ),
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[RankKeyset] = Depends(get_search_cursor),
+    db: AsyncSession = Depends(get_read_db),
+) -> Any:
+    """Search books by title and description, best matches first, paged by cursor"""
+    etag = make_etag("search", *await BookService.get_catalog_version(db))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+
+    # === Fetch one extra hit to know if there is a next page ===
+    hits = await BookService.search(db=db, q=q, limit=limit + 1, after=after)
+    hits, next_cursor = split_page(
+        hits, limit, lambda hit: encode_rank_cursor(hit.rank, hit.id)
+    )
+    return with_cache_headers(
+        render(BookSearchResults, {"books": hits, "next_cursor": next_cursor}),
+        response,
+        etag,
+    )
 
 
 @router.get("/{book_id}", response_model=Book)
-async def read_book(book_id: int, db: AsyncSession = Depends(get_db)) -> Any:
-    """Get a book by id"""
+async def read_book(
+    book_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+) -> Any:
+    """Get a book by id, with a 304 when the client's ETag still matches"""
     book = await BookService.get(db=db, book_id=book_id)
     if not book:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Book not found",
         )
-    return book
+
+    etag = make_etag("book", book.id, book.updated_at.strftime("%Y%m%d%H%M%S%f"))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    return with_cache_headers(render(Book, book), response, etag)
 
 
 @router.post("/", response_model=Book)
 async def create_book(
     book_create: BookCreate,
-    current_user: User = Depends(get_current_active_superuser),
+    current_user: Principal = Depends(get_current_active_superuser),
     db: AsyncSession = Depends(get_db),
 ) -> Any:
     """Create a new book, admin only"""
@@ -54,12 +185,93 @@ async def create_book(
     return book
 
 
+@router.post("/import", response_model=BookImportResult)
+async def import_books(
+    request: Request,
+    fmt: Optional[BookImportFormat] = Query(
+        None,
+        alias="format",
+        description="csv or ndjson, defaults to what Content-Type says",
+    ),
+    current_user: Principal = Depends(get_current_active_superuser),
+    db: AsyncSession = Depends(get_db),
+) -> Any:
+    """
+    Import books from a CSV (with a header row) or NDJSON request body, admin only.
+    The body is streamed and loaded in batches,
+    invalid rows are skipped and reported by line.
+    """
+    if fmt is None:
+        content_type = request.headers.get("content-type", "")
+        fmt = (
+            BookImportFormat.NDJSON if "json" in content_type else BookImportFormat.CSV
+        )
+
+    return await BookImportService.import_stream(
+        db=db, chunks=request.stream(), fmt=fmt
+    )
+
+
+@router.post("/{book_id}/image", response_model=BookImage)
+async def upload_book_image(
+    book_id: int,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: Principal = Depends(get_current_active_superuser),
+    db: AsyncSession = Depends(get_db),
+) -> Any:
+    """
+    Upload a JPEG, PNG or WebP cover as the raw request body, admin only.
+    The body is streamed to disk, resized variants
+    are generated after the response is sent.
+    """
+    book = await BookService.get(db=db, book_id=book_id)
+    if not book:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Book not found",
+        )
+
+    # === Refuse a declared oversized body before reading any of it ===
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image is larger than {settings.MAX_FILE_SIZE} bytes",
+        )
+
+    try:
+        name = await store_upload(request.stream())
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image is larger than {settings.MAX_FILE_SIZE} bytes",
+        )
+    except UnsupportedImage:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Image must be a JPEG, PNG or WebP",
+        )
+
+    book = await BookService.update(
+        db=db, book=book, book_update=BookUpdate(image_url=media_url(name))
+    )
+    background_tasks.add_task(render_variants, name)
+
+    return {
+        "book": book,
+        "variants": {
+            size: media_url(variant) for size, variant in variant_names(name).items()
+        },
+    }
+
+
 @router.put("/{book_id}", response_model=Book)
 async def update_book(
     book_id: int,
     book_update: BookUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_superuser),
+    current_user: Principal = Depends(get_current_active_superuser),
 ) -> Any:
     """Update a book (Admin only)"""
     book = await BookService.get(db=db, book_id=book_id)
@@ -77,7 +289,7 @@ async def update_book(
 async def delete_book(
     book_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_superuser),
+    current_user: Principal = Depends(get_current_active_superuser),
 ) -> None:
     """Delete a book"""
     book = await BookService.get(db=db, book_id=book_id)
@@ -88,6 +300,11 @@ async def delete_book(
         )
 
     book = await BookService.delete(db, book=book)
+    if not book:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Book has been ordered and cannot be deleted",
+        )
     return None
 
 
@@ -1,46 +1,80 @@
-from typing import Any
+from typing import Any, List, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 
-from app.database import get_db
-from app.services import OrderService
-from app.core.payment import process_payment
+from app.config import settings
+from app.core import run_idempotent
+from app.database import get_db, get_read_db
+from app.services import (
+    CountService,
+    LoadProfile,
+    OrderService,
+    PaymentInFlight,
+    PaymentService,
+)
 from app.schemas import OrderCreate, OrderList
-from app.models import User, OrderStatus
-from app.schemas import Order
-from app.api.deps import get_current_active_user
-from app.schemas.payment import PaymentRequest, PaymentResponse
+from app.models import Order as OrderModel, OrderStatus
+from app.schemas import Order, Principal
+from app.utils.fields import sparse_response
+from app.utils.responses import encode, render
+from app.utils.pagination import Keyset, split_page
+from app.api.deps import (
+    get_current_active_user,
+    get_idempotency_key,
+    get_page_cursor,
+    get_sparse_fields,
+)
+from app.schemas.payment import PaymentAttempt, PaymentRequest
 
 router = APIRouter()
 
 
 @router.get("/", response_model=OrderList)
 async def read_orders(
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user),
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    after: Optional[Keyset] = Depends(get_page_cursor),
+    fields: Optional[List[str]] = Depends(get_sparse_fields(Order, OrderModel)),
 ) -> Any:
-    """Get current user's orders"""
+    """
+    Get current user's orders, paged by skip/limit
+    or by cursor, optionally with only some `fields`
+    """
+    # === Fetch one extra row to know if there is a next page ===
     orders = await OrderService.get_user_orders(
-        db, current_user.id, skip=skip, limit=limit
+        db, current_user.id, skip=skip, limit=limit + 1, after=after, fields=fields
+    )
+    orders, next_cursor = split_page(orders, limit)
+    total, total_exact = await CountService.get_total(
+        db,
+        settings.ORDERS_COUNT_MODE,
+        ("orders", current_user.id),
+        lambda: OrderService.get_total_count(db, user_id=current_user.id),
     )
-    total = await OrderService.get_total_count(db, user_id=current_user.id)
 
-    return {
+    content = {
         "orders": orders,
         "total": total,
+        "total_exact": total_exact,
         "page": skip // limit + 1,
         "per_page": limit,
         "pages": (total + limit - 1) // limit,
+        "next_cursor": next_cursor,
     }
+    if fields:
+        return sparse_response(
+            Order, fields, content, list_schema=OrderList, items_key="orders"
+        )
+    return render(OrderList, content)
 
 @router.get("/{order_id}", response_model=Order)
 async def read_order(
     order_id: int,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """Get order by ID"""
     order = await OrderService.get(db, order_id)
@@ -56,39 +90,57 @@ async def read_order(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You are not authorized to view this order",
         )
-    return order
+    return render(Order, order)
 
 @router.post("/", response_model=Order)
 async def create_order(
     order_create: OrderCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
 ) -> Any:
-    """Create new order"""
+    """
+    Create new order, retries with the same Idempotency-Key
+    get the created order instead of a new one
+    """
     if not order_create.items:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Order must contain at least one item",
         )
 
-    order = await OrderService.create(db, current_user, order_create)
-    if not order:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to create order, check book availability",
-        )
+    async def create() -> Response:
+        order = await OrderService.create(db, current_user.id, order_create)
+        if not order:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Failed to create order, check book availability",
+            )
+        return Response(content=encode(Order, order), media_type="application/json")
 
-    return order
+    key = (
+        ("orders.create", current_user.id, idempotency_key) if idempotency_key else None
+    )
+    return await run_idempotent(key, order_create.model_dump_json().encode(), create)
 
 
-@router.post("/{order_id/pay", response_model=PaymentResponse)
+@router.post(
+    "/{order_id}/pay",
+    response_model=PaymentAttempt,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def pay_order(
     order_id: int,
     payment_request: PaymentRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
 ) -> Any:
-    """Pay an order"""
+    """
+    Pay an order. The payment is queued and processed in the background,
+    poll the attempt at the Location header for its result.
+    Retries with the same Idempotency-Key get the first attempt instead of a 409.
+    """
     # === Validate order_id in request matches path ===
     if payment_request.order_id != order_id:
         raise HTTPException(
@@ -96,8 +148,73 @@ async def pay_order(
             detail="Order ID mismatch",
         )
 
-    # === Get Order ===
-    order = await OrderService.get(db, order_id)
+    async def pay() -> Response:
+        order = await OrderService.get(db, order_id, profile=LoadProfile.ORDER)
+        if not order:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Order not found",
+            )
+
+        # === Check if user owns the order ===
+        if order.user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions",
+            )
+
+        # === Check if order's already been paid ===
+        if order.status != OrderStatus.PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Order status is already paid",
+            )
+
+        # === Queue the payment, the gateway is called by the payment workers ===
+        attempt = await PaymentService.enqueue(db, order, payment_request.card_number)
+        if not attempt:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A payment of this order is already in progress",
+            )
+
+        return Response(
+            content=encode(PaymentAttempt, attempt),
+            status_code=status.HTTP_202_ACCEPTED,
+            headers={
+                "Location": f"{settings.API_V1_STR}/orders/{order_id}"
+                f"/payments/{attempt.id}"
+            },
+            media_type="application/json",
+        )
+
+    # === The fingerprint covers the card number, but only as a hash ===
+    key = (
+        ("orders.pay", current_user.id, order_id, idempotency_key)
+        if idempotency_key
+        else None
+    )
+    return await run_idempotent(key, payment_request.model_dump_json().encode(), pay)
+
+
+@router.get("/{order_id}/payments/{attempt_id}", response_model=PaymentAttempt)
+async def read_payment(
+    order_id: int,
+    attempt_id: int,
+    wait: int = Query(
+        0,
+        ge=0,
+        le=settings.PAYMENT_MAX_WAIT,
+        description="Seconds to wait for the payment to finish",
+    ),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_active_user),
+) -> Any:
+    """
+    Get a payment attempt of an order, with `wait` it's
+    answered once the payment finishes or the wait is over
+    """
+    order = await OrderService.get(db, order_id, profile=LoadProfile.ORDER)
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -105,51 +222,30 @@ async def pay_order(
         )
 
     # === Check if user owns the order ===
-    if order.user_id != current_user.id:
+    if order.user_id != current_user.id and not current_user.is_superuser:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions",
+            detail="You are not authorized to view this order",
         )
 
-    # === Check if order's already been paid ===
-    if order.status != OrderStatus.PENDING:
+    attempt = await PaymentService.get_attempt(db, order_id, attempt_id)
+    if not attempt:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Order status is already paid",
-        )
-
-    # === Process the payment ===
-    success, message, transaction_id = await process_payment(
-        payment_request.card_number
-    )
-
-    if success:
-        # === Update order status and stock ===
-        order = await OrderService.process_payment_success(
-            db, order, payment_request.card_number
-        )
-    else:
-        # === Update order status to fail ===
-        order = await OrderService.update_status(
-            db, order, OrderStatus.FAILED, payment_request.card_number
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Payment not found",
         )
 
-    return {
-        "success": success,
-        "message": message,
-        "order_id": order_id,
-        "transaction_id": transaction_id,
-    }
+    return await PaymentService.wait(db, attempt, wait)
 
 
 @router.post("/{order_id}/cancel", response_model=Order)
 async def cancel_order(
     order_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ) -> Any:
     """Cancel an order"""
-    order = await OrderService.get(db, order_id)
+    order = await OrderService.get(db, order_id, profile=LoadProfile.ORDER)
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -169,8 +265,19 @@ async def cancel_order(
             detail=f"Cannot cancel order with status {order.status}"
         )
 
-    # === Update order status ===
-    order = await OrderService.update_status(db, order, OrderStatus.CANCELLED)
-    return order
+    # === Update order status, checked again with the order locked ===
+    try:
+        cancelled = await OrderService.cancel(db, order_id)
+    except PaymentInFlight:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A payment of this order is in progress, it can't be cancelled now",
+        )
+    if not cancelled:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Order can no longer be cancelled",
+        )
+    return cancelled
 
 
@@ -6,15 +6,15 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from app.models import User
 from app.database import get_db
 from app.services import UserService
-from app.api.deps import get_current_active_user
-from app.schemas import User as UserSchema, UserUpdate
+from app.api.deps import get_current_active_user, get_current_user
+from app.schemas import Principal, User as UserSchema, UserUpdate
 
 
 router = APIRouter()
 
 
 @router.get("/me", response_model=UserSchema)
-async def read_user_me(current_user: User = Depends(get_current_active_user)):
+async def read_user_me(current_user: User = Depends(get_current_user)):
     """Get current user info"""
     return current_user
 
@@ -23,7 +23,7 @@ async def read_user_me(current_user: User = Depends(get_current_active_user)):
 async def update_user_me(
     user_update: UserUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)):
+    current_user: User = Depends(get_current_user)):
     """Update current user info"""
     # === Check if email is taken ===
     if user_update.email:
@@ -51,7 +51,7 @@ async def update_user_me(
 async def read_user(
     user_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)) -> Any:
+    current_user: Principal = Depends(get_current_active_user)) -> Any:
     """Get user by ID"""
     user = await UserService.get(db=db, user_id=user_id)
     if not user:
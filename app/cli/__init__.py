@@ -0,0 +1 @@
+# CLI Package
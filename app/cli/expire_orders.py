@@ -0,0 +1,39 @@
+"""
+Cancel PENDING and FAILED orders left unpaid for too long.
+
+Usage: python -m app.cli.expire_orders
+    [--older-than SECONDS] [--batch-size N] [--pause SECONDS]
+"""
+import asyncio
+import argparse
+
+from app.config import settings
+from app.database import engine
+from app.services import OrderService
+
+
+async def main(older_than: int, batch_size: int, pause: float) -> None:
+    cancelled = await OrderService.expire_stale(older_than, batch_size, pause)
+    await engine.dispose()
+    print(f"Cancelled {cancelled} expired orders")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cancel PENDING and FAILED orders left unpaid for too long"
+    )
+    parser.add_argument(
+        "--older-than", type=int, default=settings.ORDER_EXPIRE_AFTER, help="seconds"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.ORDER_EXPIRY_BATCH_SIZE
+    )
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=settings.ORDER_EXPIRY_BATCH_PAUSE,
+        help="seconds between batches",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(main(args.older_than, args.batch_size, args.pause))
@@ -0,0 +1,48 @@
+"""
+Import books from a CSV (with a header row) or NDJSON file.
+
+Usage: python -m app.cli.import_books books.csv [--format csv|ndjson]
+"""
+import asyncio
+import argparse
+from typing import AsyncIterator
+
+from app.database import AsyncSessionLocal, engine
+from app.schemas import BookImportFormat
+from app.services import BookImportService
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def read_chunks(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+
+async def main(path: str, fmt: BookImportFormat) -> None:
+    async with AsyncSessionLocal() as db:
+        result = await BookImportService.import_stream(db, read_chunks(path), fmt)
+    await engine.dispose()
+
+    print(f"Imported {result['imported']} books, {result['failed']} rows failed")
+    for error in result["errors"]:
+        print(f"  line {error['line']}: {'; '.join(error['errors'])}")
+    if result["errors_truncated"]:
+        print("  ...")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import books from a CSV or NDJSON file"
+    )
+    parser.add_argument("path")
+    parser.add_argument(
+        "--format", choices=[f.value for f in BookImportFormat], default=None
+    )
+    args = parser.parse_args()
+
+    fmt = args.format or (
+        "ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv"
+    )
+    asyncio.run(main(args.path, BookImportFormat(fmt)))
@@ -0,0 +1,23 @@
+"""
+Rebuild the admin statistics rollup from scratch.
+
+Usage: python -m app.cli.rebuild_statistics
+"""
+import asyncio
+
+from app.database import engine
+from app.services import StatisticsService
+
+
+async def main() -> None:
+    rebuilt = await StatisticsService.rebuild()
+    await engine.dispose()
+    print(
+        "Statistics rollup rebuilt"
+        if rebuilt
+        else "Another process is rebuilding the rollup, skipped"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import List, Literal, Optional, Union
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import AnyHttpUrl, EmailStr, PostgresDsn, field_validator
@@ -43,17 +43,113 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
     REFRESH_TOKEN_EXPIRE_MINUTES: int = 7
+    TOKEN_CACHE_MAXSIZE: int = 50_000  # verified access tokens kept until they expire
+    PRINCIPAL_CACHE_TTL: int = 10  # seconds, bans reach other workers within this time
+    PRINCIPAL_CACHE_MAXSIZE: int = 10_000
+    # threads hashing with bcrypt, defaults to CPU count
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    # hashes allowed to wait for a thread before rejecting
+    PASSWORD_HASH_QUEUE_LIMIT: int = 64
     
     # === Database ===
     DATABASE_URL: PostgresDsn
+    # read replica for catalog and order reads
+    DATABASE_REPLICA_URL: Optional[PostgresDsn] = None
+    # reads stay on the primary this long after the replica failed
+    DATABASE_REPLICA_RETRY_SECONDS: int = 30
+    # reads stay on the primary this long after a client wrote
+    READ_PRIMARY_STICKY_SECONDS: int = 5
+    # pooled connections one request may use at once for independent reads
+    DB_CONCURRENT_QUERIES: int = 4
+    DB_POOL_SIZE: int = 5  # connections kept open per worker
+    # extra connections opened under load, closed when returned
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30  # seconds to wait for a connection before failing
+    DB_POOL_RECYCLE: int = -1  # seconds before a connection is replaced, -1 never
+    # check connections on checkout, survives database restarts
+    DB_POOL_PRE_PING: bool = False
+    # asyncpg prepared statements per connection, 0 behind pgbouncer
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # SQLAlchemy prepared statements per connection, 0 behind pgbouncer
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
     
     # === First Superuser ===
     FIRST_SUPERUSER_EMAIL: EmailStr
     FIRST_SUPERUSER_PASSWORD: str
     
+    # === List Totals: exact | cached | estimated ===
+    BOOKS_COUNT_MODE: Literal["exact", "cached", "estimated"] = "exact"
+    ORDERS_COUNT_MODE: Literal["exact", "cached", "estimated"] = "exact"
+    ADMIN_ORDERS_COUNT_MODE: Literal["exact", "cached", "estimated"] = "exact"
+    COUNT_CACHE_TTL: int = 30  # seconds
+    COUNT_CACHE_MAXSIZE: int = 10_000
+
+    # === Book Cache ===
+    BOOK_CACHE_ENABLED: bool = True
+    BOOK_CACHE_TTL: int = 60  # seconds
+    BOOK_CACHE_MAXSIZE: int = 10_000
+
+    # === Admin Statistics ===
+    # seconds between rollup rebuilds, 0 rebuilds only at startup, -1 leaves it to cron
+    STATS_RECONCILE_INTERVAL: int = 3600
+
+    # === Order Expiry ===
+    # seconds a PENDING or FAILED order stays before it's cancelled
+    ORDER_EXPIRE_AFTER: int = 24 * 60 * 60
+    # seconds between sweeps, 0 leaves it to python -m app.cli.expire_orders
+    ORDER_EXPIRY_INTERVAL: int = 300
+    ORDER_EXPIRY_BATCH_SIZE: int = 500  # orders cancelled per statement and transaction
+    # seconds between batches, leaves room for live traffic
+    ORDER_EXPIRY_BATCH_PAUSE: float = 0.1
+
+    # === Idempotency ===
+    # seconds a response is replayed for retries with the same Idempotency-Key
+    IDEMPOTENCY_TTL: int = 24 * 60 * 60
+    IDEMPOTENCY_CACHE_MAXSIZE: int = 10_000
+
+    # === Payments ===
+    PAYMENT_WORKERS: int = 4  # coroutines taking payment attempts off the queue
+    # attempts a worker takes at once, their gateway calls run concurrently
+    PAYMENT_BATCH_SIZE: int = 10
+    # queued attempts per process, pay answers 503 when full
+    PAYMENT_QUEUE_SIZE: int = 1_000
+    # seconds after which an unfinished attempt counts as lost and fails
+    PAYMENT_ATTEMPT_TIMEOUT: int = 300
+    # longest gateway call, in seconds, well below PAYMENT_ATTEMPT_TIMEOUT
+    PAYMENT_CALL_TIMEOUT: float = 30.0
+    PAYMENT_MAX_WAIT: int = 30  # longest long poll on an attempt, in seconds
+    # simulated gateway latency range, in seconds
+    PAYMENT_GATEWAY_LATENCY_MIN: float = 0.0
+    PAYMENT_GATEWAY_LATENCY_MAX: float = 0.0
+    # share of valid cards the simulated gateway declines
+    PAYMENT_GATEWAY_FAILURE_RATE: float = 0.0
+
+    # === Responses ===
+    # read endpoints validate once and encode JSON in pydantic-core
+    FAST_JSON_RESPONSES: bool = False
+    # seconds browsers and CDNs may reuse catalog responses without revalidating
+    CATALOG_CACHE_MAX_AGE: int = 60
+
+    # === Monitoring ===
+    METRICS_ENABLED: bool = True  # serve /metrics in Prometheus text format
+
+    # === Bulk Import ===
+    # validated rows loaded with one COPY and committed together
+    IMPORT_BATCH_SIZE: int = 5_000
+    # row errors reported in detail, further ones are only counted
+    IMPORT_MAX_ERRORS: int = 100
+
     # === File Upload ===
     UPLOAD_DIR: str = "uploads/books/"
-    MAX_FILE_SIZE: int = 5 * 1024 * 1024 # 5MB
+    MAX_FILE_SIZE: int = 5 * 1024 * 1024  # 5MB
+    MEDIA_URL: str = "/media/"  # URL prefix of stored files
+    # seconds clients may cache media, names change with content
+    MEDIA_CACHE_MAX_AGE: int = 365 * 24 * 60 * 60
+    # max edge in pixels of resized cover variants
+    IMAGE_VARIANT_SIZES: List[int] = [200, 600]
+    IMAGE_VARIANT_QUALITY: int = 80  # WebP quality of resized variants
+    # processes resizing images, defaults to CPU count
+    IMAGE_WORKERS: Optional[int] = None
     
     @property
     def sqlalchemy_database_url(self ) -> str:
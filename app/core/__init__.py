@@ -1,11 +1,52 @@
-from .security import create_access_token, verify_access_token, verify_password, get_password_hash
+from .security import (
+    PasswordHasherBusy,
+    create_access_token,
+    get_password_hash,
+    get_password_hash_async,
+    shutdown_password_hasher,
+    verify_access_token,
+    verify_password,
+    verify_password_async,
+)
+from .media import (
+    UnsupportedImage,
+    UploadTooLarge,
+    media_key,
+    media_path,
+    media_url,
+    render_variants,
+    shutdown_image_workers,
+    store_upload,
+    variant_names,
+)
+from .idempotency import IdempotencyKeyReused, run_idempotent
 from .payment import process_payment
+from .principal import invalidate_principal
 
 __all__ = [
     "create_access_token",
     "verify_access_token",
     "verify_password",
     "get_password_hash",
+    "verify_password_async",
+    "get_password_hash_async",
+    "shutdown_password_hasher",
+    "PasswordHasherBusy",
+
+    "invalidate_principal",
+
+    "store_upload",
+    "render_variants",
+    "variant_names",
+    "media_url",
+    "media_path",
+    "media_key",
+    "shutdown_image_workers",
+    "UploadTooLarge",
+    "UnsupportedImage",
+
+    "run_idempotent",
+    "IdempotencyKeyReused",
 
     "process_payment"
 ]
\ No newline at end of file
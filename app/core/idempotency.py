@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from fastapi import Response
+
+from app.config import settings
+from app.utils.cache import TTLCache
+
+
+class IdempotencyKeyReused(ValueError):
+    """An Idempotency-Key was sent again with a different request"""
+
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    status_code: int
+    body: bytes
+    headers: List[Tuple[bytes, bytes]]
+
+
+# === Successful responses by (operation, user, Idempotency-Key) ===
+idempotency_cache = TTLCache(
+    maxsize=settings.IDEMPOTENCY_CACHE_MAXSIZE, ttl=settings.IDEMPOTENCY_TTL
+)
+
+# === Requests still running, with the fingerprint of their payload ===
+_in_flight: Dict[Hashable, Tuple[str, "asyncio.Future[None]"]] = {}
+
+
+def fingerprint(payload: bytes) -> str:
+    """Fingerprint a request payload, a key may only be reused with the same one"""
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _replay(stored: StoredResponse) -> Response:
+    response = Response(content=stored.body, status_code=stored.status_code)
+    response.raw_headers = [*stored.headers, (b"idempotent-replayed", b"true")]
+    return response
+
+
+async def run_idempotent(
+    key: Optional[Hashable], payload: bytes, run: Callable[[], Awaitable[Response]]
+) -> Response:
+    """
+    Run a request once per idempotency key.
+    A retry gets the stored response of the first run,
+    a retry arriving while it still runs waits for it.
+    Only 2xx responses are stored, after an error the next retry runs again.
+    Kept in process, like the other caches, so retries
+    must reach the same process to be deduplicated.
+
+    :param key: identifies the operation, the user and their
+        Idempotency-Key, None runs without deduplication
+    :param payload: the request payload
+    :raises IdempotencyKeyReused: the key was used with a different payload
+    """
+    if key is None:
+        return await run()
+
+    request_fingerprint = fingerprint(payload)
+    while True:
+        stored: Optional[StoredResponse] = idempotency_cache.get(key)
+        if stored is not None:
+            if stored.fingerprint != request_fingerprint:
+                raise IdempotencyKeyReused()
+            return _replay(stored)
+
+        in_flight = _in_flight.get(key)
+        if in_flight is None:
+            break
+        if in_flight[0] != request_fingerprint:
+            raise IdempotencyKeyReused()
+        # === Wait for the first run, then look again, ===
+        # === it may have failed and not been stored ===
+        await asyncio.shield(in_flight[1])
+
+    done: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+    _in_flight[key] = (request_fingerprint, done)
+    try:
+        response = await run()
+        if 200 <= response.status_code < 300:
+            headers = [
+                (name, value)
+                for name, value in response.raw_headers
+                if name != b"set-cookie"
+            ]
+            idempotency_cache.set(
+                key,
+                StoredResponse(
+                    request_fingerprint, response.status_code, response.body, headers
+                ),
+            )
+        return response
+    finally:
+        del _in_flight[key]
+        done.set_result(None)
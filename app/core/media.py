@@ -0,0 +1,183 @@
+import os
+import re
+import asyncio
+import hashlib
+import logging
+import tempfile
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+
+import anyio
+from PIL import Image, ImageOps
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# === Magic bytes of accepted images -> file extension ===
+IMAGE_SIGNATURES: List[Tuple[bytes, str]] = [
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+]
+SIGNATURE_LENGTH = 12
+
+# === Names of stored images and their variants, `ab/cd/<sha256>[_<size>].<ext>` ===
+MEDIA_NAME = re.compile(
+    r"([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60}(?:_\d+)?)\.(jpg|png|webp)"
+)
+
+# === Resizing is CPU bound and holds the GIL, so it ===
+# === runs in worker processes, started on first use ===
+_image_executor: Optional[ProcessPoolExecutor] = None
+
+
+class UploadTooLarge(ValueError):
+    """The upload is bigger than MAX_FILE_SIZE"""
+
+
+class UnsupportedImage(ValueError):
+    """The upload is not a JPEG, PNG or WebP image"""
+
+
+def _image_extension(head: bytes) -> Optional[str]:
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def media_path(name: str) -> str:
+    """Get the path of a stored file from its name, `ab/cd/abcd...ext`"""
+    return os.path.join(settings.UPLOAD_DIR, name)
+
+
+def media_key(name: str) -> Optional[str]:
+    """
+    Get the content hash (and variant size) a stored
+    file name stands for, None if it isn't one
+    """
+    match = MEDIA_NAME.fullmatch(name)
+    return match.group(3) if match else None
+
+
+def media_url(name: str) -> str:
+    """Get the public URL of a stored file"""
+    return settings.MEDIA_URL.rstrip("/") + "/" + name
+
+
+def variant_names(name: str) -> Dict[int, str]:
+    """Get names of the resized variants of a stored image, by their max edge"""
+    stem = name.rsplit(".", 1)[0]
+    return {size: f"{stem}_{size}.webp" for size in settings.IMAGE_VARIANT_SIZES}
+
+
+async def store_upload(chunks: AsyncIterator[bytes]) -> str:
+    """
+    Stream an uploaded image to disk, content addressed by its sha256.
+    The same image uploaded twice is stored once.
+
+    :return: name of the stored file, relative to UPLOAD_DIR
+    :raises UploadTooLarge: the upload exceeded MAX_FILE_SIZE, nothing is kept
+    :raises UnsupportedImage: the upload doesn't start like a JPEG, PNG or WebP image
+    """
+    digest = hashlib.sha256()
+    head = b""
+    size = 0
+
+    # === File system calls run in worker threads, to keep the event loop free ===
+    fd, tmp_path = await anyio.to_thread.run_sync(
+        lambda: tempfile.mkstemp(dir=settings.UPLOAD_DIR, prefix=".upload-")
+    )
+    try:
+        async with await anyio.open_file(fd, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    raise UploadTooLarge()
+                if len(head) < SIGNATURE_LENGTH:
+                    head += chunk[:SIGNATURE_LENGTH - len(head)]
+                digest.update(chunk)
+                await f.write(chunk)
+
+        extension = _image_extension(head)
+        if extension is None:
+            raise UnsupportedImage()
+
+        hexdigest = digest.hexdigest()
+        name = f"{hexdigest[:2]}/{hexdigest[2:4]}/{hexdigest}.{extension}"
+        await anyio.to_thread.run_sync(_keep, tmp_path, media_path(name))
+        return name
+    except BaseException:
+        with anyio.CancelScope(shield=True):
+            await anyio.to_thread.run_sync(_discard, tmp_path)
+        raise
+
+
+def _keep(tmp_path: str, path: str) -> None:
+    """
+    Move a finished upload to its name, or drop it if the same content is stored already
+    """
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+
+def _discard(tmp_path: str) -> None:
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def _render_variants(path: str, variants: Dict[int, str]) -> None:
+    """Write resized WebP variants of an image, runs in a worker process"""
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        for size, variant_path in variants.items():
+            if os.path.exists(variant_path):
+                continue
+            variant = image.copy()
+            variant.thumbnail((size, size))
+            # === A unique temp name, other processes ===
+            # === may render the same variant at once ===
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(variant_path), prefix=".variant-"
+            )
+            os.close(fd)
+            try:
+                variant.save(
+                    tmp_path, format="WEBP", quality=settings.IMAGE_VARIANT_QUALITY
+                )
+                os.replace(tmp_path, variant_path)
+            finally:
+                _discard(tmp_path)
+
+
+async def render_variants(name: str) -> None:
+    """Generate missing resized variants of a stored image in the image process pool"""
+    global _image_executor
+    if _image_executor is None:
+        _image_executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+
+    variants = {
+        size: media_path(variant) for size, variant in variant_names(name).items()
+    }
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            _image_executor, _render_variants, media_path(name), variants
+        )
+    except Exception:
+        logger.exception("Resizing %s failed", name)
+
+
+def shutdown_image_workers() -> None:
+    """Stop the image process pool, on application shutdown"""
+    global _image_executor
+    if _image_executor is not None:
+        _image_executor.shutdown(wait=False, cancel_futures=True)
+        _image_executor = None
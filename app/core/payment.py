@@ -1,21 +1,35 @@
 import uuid
+import random
+import asyncio
 from typing import Tuple
 
+from app.config import settings
+
 async def process_payment(card_number: str) -> Tuple[bool, str, str]:
     """
     Simulate payment processing.
     Return success if the card number is even, failure if odd.
+    Latency and random declines follow the
+    PAYMENT_GATEWAY_* settings, to load test locally.
 
     :param card_number: 16-digit card number
     :return: Tuple of (success, message, transaction_id)
     """
 
-    # === Check ig the last digit is even ===
-    last_digit = card_number[-1]
+    # === Wait like the real gateway does ===
+    latency = random.uniform(
+        settings.PAYMENT_GATEWAY_LATENCY_MIN, settings.PAYMENT_GATEWAY_LATENCY_MAX
+    )
+    if latency > 0:
+        await asyncio.sleep(latency)
 
-    last_digit = int(last_digit)
+    # === Check ig the last digit is even ===
+    last_digit = int(card_number[-1])
 
     if last_digit % 2 == 0:
+        if random.random() < settings.PAYMENT_GATEWAY_FAILURE_RATE:
+            return False, "Payment declined by the gateway. Please try again.", ""
+
         # === Payment successful ===
         transaction_id = str(uuid.uuid4())
         return True, "Payment succeeded", transaction_id
@@ -0,0 +1,12 @@
+from app.config import settings
+from app.utils.cache import TTLCache
+
+# === Authenticated principals by token subject (username) ===
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAXSIZE, ttl=settings.PRINCIPAL_CACHE_TTL
+)
+
+
+def invalidate_principal(username: str) -> None:
+    """Drop a cached principal after the user's auth fields changed"""
+    principal_cache.invalidate(username)
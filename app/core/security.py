@@ -1,13 +1,36 @@
-from typing import Any, Optional, Union
+import os
+import time
+import asyncio
+from typing import Any, Callable, Optional, TypeVar, Union
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from app.config import settings
+from app.utils.cache import TTLCache
+
+T = TypeVar("T")
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# === bcrypt releases the GIL, so a thread pool ===
+# === hashes on all cores, started on first use ===
+_hash_workers = settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+_hash_executor: Optional[ThreadPoolExecutor] = None
+_hash_pending = 0
+
+# === Verified access tokens: token -> (subject, ===
+# === secret key and algorithm it was verified with) ===
+token_cache = TTLCache(
+    maxsize=settings.TOKEN_CACHE_MAXSIZE, ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Too many password hashes are running or waiting already"""
+
 
 def create_access_token(
     subject: Union[str, Any], expires_delta: Optional[timedelta] = None
@@ -26,12 +49,31 @@ def create_access_token(
 
 
 def verify_access_token( token: str ) -> Optional[str]:
-    """Verify JWT token and return username"""
+    """
+    Verify JWT token and return username, tokens verified before are served from cache
+    """
+    cached = token_cache.get(token)
+    if cached is not None:
+        cached_username, secret_key, algorithm = cached
+        # === Entries signed with a rotated key are verified again ===
+        if secret_key == settings.SECRET_KEY and algorithm == settings.ALGORITHM:
+            return cached_username
+        token_cache.invalidate(token)
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             return None
+
+        # === Cache the token until it expires ===
+        expire = payload.get("exp")
+        if expire is not None and expire > time.time():
+            token_cache.set(
+                token,
+                (username, settings.SECRET_KEY, settings.ALGORITHM),
+                ttl=expire - time.time(),
+            )
         return username
     except JWTError:
         return None
@@ -44,4 +86,41 @@ def verify_password( plain_password: str, hashed_password: str ) -> bool:
 
 def get_password_hash( password: str ) -> str:
     """Generate password hash"""
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+
+async def _run_hasher(func: Callable[..., T], *args: Any) -> T:
+    """Run a bcrypt call in the hashing pool, reject it if the pool queue is full"""
+    global _hash_executor, _hash_pending
+    if _hash_pending >= _hash_workers + settings.PASSWORD_HASH_QUEUE_LIMIT:
+        raise PasswordHasherBusy("Password hashing queue is full")
+
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=_hash_workers, thread_name_prefix="password-hash"
+        )
+
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_pending -= 1
+
+
+async def verify_password_async( plain_password: str, hashed_password: str ) -> bool:
+    """Verify password against hash without blocking the event loop"""
+    return await _run_hasher(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async( password: str ) -> str:
+    """Generate password hash without blocking the event loop"""
+    return await _run_hasher(get_password_hash, password)
+
+
+def shutdown_password_hasher() -> None:
+    """Stop the hashing pool"""
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
@@ -1,7 +1,24 @@
-from typing import AsyncGenerator
+import time
+import asyncio
+import logging
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
 
+from fastapi import Request
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
@@ -9,21 +26,115 @@ from sqlalchemy.ext.asyncio import (
 
 from app.config import settings
 
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Connection pool counting checkouts, time spent
+    getting a connection and checkout timeouts
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self) -> Any:
+        # === Includes waiting for a free connection and opening overflow ones ===
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Get pool occupancy and checkout counters"""
+        return {
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+        }
+
+
+def pool_stats(engine: AsyncEngine) -> Dict[str, Union[int, float]]:
+    """
+    Get the counters of an engine's pool, engines
+    made by create_engine have an InstrumentedPool
+    """
+    pool = engine.pool
+    if not isinstance(pool, InstrumentedPool):
+        raise TypeError(
+            f"Engine pool is a {type(pool).__name__}, not an InstrumentedPool"
+        )
+    return pool.stats()
+
+
+def create_engine(url: str) -> AsyncEngine:
+    """Create an async engine with the pool and statement cache settings"""
+    return create_async_engine(
+        url,
+        echo=settings.DEBUG,
+        future=True,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+        },
+    )
+
+
+def create_session_factory(bind: AsyncEngine) -> async_sessionmaker:
+    """Create a session factory bound to an engine"""
+    return async_sessionmaker(
+        bind,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+    )
+
+
 # === async engine ===
-engine = create_async_engine(
-    settings.sqlalchemy_database_url,
-    echo=settings.DEBUG,
-    future=True,
-)
+engine = create_engine(settings.sqlalchemy_database_url)
 
 # === async session factory ===
-AsyncSessionLocal = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False,
-)
+AsyncSessionLocal = create_session_factory(engine)
+
+# === Read replica, reads go to the primary when it isn't configured ===
+replica_engine: Optional[AsyncEngine] = None
+ReadSessionLocal = AsyncSessionLocal
+if settings.DATABASE_REPLICA_URL is not None:
+    replica_engine = create_engine(str(settings.DATABASE_REPLICA_URL))
+    ReadSessionLocal = create_session_factory(replica_engine)
+
+# === Set after a successful write, reads of this ===
+# === client stay on the primary until it expires ===
+READ_PRIMARY_COOKIE = "read_primary"
+
+# === monotonic time until which the replica is skipped after failing to connect ===
+_replica_down_until = 0.0
 
 class Base(DeclarativeBase):
     """Base class for all models"""
@@ -36,3 +147,71 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             yield session
         finally:
             await session.close()
+
+
+def read_session_factory(request: Optional[Request] = None) -> async_sessionmaker:
+    """
+    Get the session factory for reads: the replica, unless there is none, it is down,
+    or the client just wrote and must read its own writes.
+    """
+    if replica_engine is None or time.monotonic() < _replica_down_until:
+        return AsyncSessionLocal
+    if request is not None and request.cookies.get(READ_PRIMARY_COOKIE):
+        return AsyncSessionLocal
+    return ReadSessionLocal
+
+
+def is_replica(session: AsyncSession) -> bool:
+    """
+    Check if a session reads from the replica, whose rows may lag behind the primary
+    """
+    return replica_engine is not None and session.bind is replica_engine
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Dependency to get a read-only database session, on the replica when possible"""
+    global _replica_down_until
+
+    factory = read_session_factory(request)
+    session = factory()
+    try:
+        if factory is not AsyncSessionLocal:
+            try:
+                await session.connection()
+            except (OSError, DBAPIError, PoolTimeoutError):
+                # === Fall back to the primary, and skip the replica for a while ===
+                logger.warning(
+                    "Read replica unavailable, reading from the primary", exc_info=True
+                )
+                _replica_down_until = (
+                    time.monotonic() + settings.DATABASE_REPLICA_RETRY_SECONDS
+                )
+                await session.close()
+                session = AsyncSessionLocal()
+        yield session
+    finally:
+        await session.close()
+
+
+async def run_concurrently(
+    *queries: Callable[[AsyncSession], Awaitable[Any]],
+    limit: Optional[int] = None,
+    session_factory: Optional[async_sessionmaker] = None,
+) -> List[Any]:
+    """
+    Run independent read-only queries at the same time, each on its own pooled session.
+    Results are returned in the order of the queries.
+
+    :param queries: coroutine functions taking a session
+    :param limit: max queries running at once, defaults to DB_CONCURRENT_QUERIES
+    :param session_factory: sessions to use, defaults to AsyncSessionLocal
+    """
+    slots = asyncio.Semaphore(limit or settings.DB_CONCURRENT_QUERIES)
+    factory = session_factory or AsyncSessionLocal
+
+    async def run(query: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        async with slots:
+            async with factory() as session:
+                return await query(session)
+
+    return list(await asyncio.gather(*(run(query) for query in queries)))
@@ -1,16 +1,45 @@
 import os
+import asyncio
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import select
+from sqlalchemy import select, text
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.api import media
 from app.api.v1 import api_router
 from app.config import settings
-from app.core import get_password_hash
-from app.database import engine, Base, AsyncSessionLocal
+from app.core import (
+    IdempotencyKeyReused,
+    PasswordHasherBusy,
+    get_password_hash_async,
+    shutdown_image_workers,
+    shutdown_password_hasher,
+)
+from app.database import (
+    READ_PRIMARY_COOKIE,
+    engine,
+    pool_stats,
+    replica_engine,
+    Base,
+    AsyncSessionLocal,
+)
+from app.core.idempotency import idempotency_cache
+from app.core.principal import principal_cache
+from app.core.security import token_cache
+from app.services.book import book_cache
+from app.services.count import count_cache
+from app.utils.metrics import cache_metrics, pool_metrics, render_prometheus
 from app.models import User
-
+from app.services import (
+    OrderService,
+    PaymentQueueFull,
+    PaymentService,
+    StatisticsService,
+)
 
 
 @asynccontextmanager
@@ -20,8 +49,9 @@ async def life_span(app: FastAPI):
     # === Create upload dir ===
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
-    # === Create tables ===
+    # === Create tables, the trigram index of book titles needs pg_trgm ===
     async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all)
 
     # === Create first superuser to escape manual ===
@@ -35,19 +65,54 @@ async def life_span(app: FastAPI):
         if not user:
             user = User(
                 email=settings.FIRST_SUPERUSER_EMAIL,
-                username='mukhsin_mukhtariy',
-                full_name='Mukhsin Mukhtorov',
-                hashed_password=get_password_hash(settings.FIRST_SUPERUSER_PASSWORD),
+                username="mukhsin_mukhtariy",
+                full_name="Mukhsin Mukhtorov",
+                hashed_password=await get_password_hash_async(
+                    settings.FIRST_SUPERUSER_PASSWORD
+                ),
                 is_active=True,
                 is_superuser=True,
             )
             db.add(user)
             await db.commit()
 
+    # === Keep admin statistics rollup reconciled with ===
+    # === the source tables, one process at a time ===
+    reconcile_task = None
+    if settings.STATS_RECONCILE_INTERVAL >= 0:
+        reconcile_task = asyncio.create_task(
+            StatisticsService.reconcile_forever(settings.STATS_RECONCILE_INTERVAL)
+        )
+
+    # === Fail payments left unfinished by a previous ===
+    # === run, then start the payment workers ===
+    async with AsyncSessionLocal() as db:
+        await PaymentService.fail_stale(db)
+        await db.commit()
+    payment_tasks = PaymentService.start_workers(settings.PAYMENT_WORKERS)
+
+    # === Cancel orders left unpaid for too long ===
+    expiry_task = None
+    if settings.ORDER_EXPIRY_INTERVAL > 0:
+        expiry_task = asyncio.create_task(
+            OrderService.expire_forever(settings.ORDER_EXPIRY_INTERVAL)
+        )
+
     yield
 
-    # == Shut down the engine ===
+    if reconcile_task is not None:
+        reconcile_task.cancel()
+    for task in payment_tasks:
+        task.cancel()
+    if expiry_task is not None:
+        expiry_task.cancel()
+
+    # == Shut down the engines ===
     await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+    shutdown_password_hasher()
+    shutdown_image_workers()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -66,9 +131,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+class ReadYourWritesMiddleware:
+    """
+    After a successful write, keep the client's reads
+    on the primary while the replica catches up.
+    Plain ASGI, it only adds a header to the response
+    start and passes the body through untouched.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.cookie = (
+            f"{READ_PRIMARY_COOKIE}=1; HttpOnly; "
+            f"Max-Age={settings.READ_PRIMARY_STICKY_SECONDS}; Path=/; SameSite=lax"
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append("set-cookie", self.cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+# === Reads only go to a replica when one is configured ===
+if replica_engine is not None:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(
+    request: Request, exc: PasswordHasherBusy
+) -> JSONResponse:
+    """
+    Ask clients to retry logins and registrations while the hashing pool is saturated
+    """
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many login attempts, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(PaymentQueueFull)
+async def payment_queue_full_handler(
+    request: Request, exc: PaymentQueueFull
+) -> JSONResponse:
+    """Ask clients to retry payments while the payment queue is full"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many payments in progress, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(IdempotencyKeyReused)
+async def idempotency_key_reused_handler(
+    request: Request, exc: IdempotencyKeyReused
+) -> JSONResponse:
+    """Refuse an Idempotency-Key sent again with a different request"""
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={"detail": "Idempotency-Key was already used with a different request"},
+    )
+
 # == Include API router ===
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+# === Serve uploaded images ===
+app.include_router(media.router, prefix=settings.MEDIA_URL.rstrip("/"), tags=["media"])
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -84,3 +222,23 @@ async def health_check():
     """Health check endpoint."""
     return {"status": "I am feeling awesome Mukhsin!!!! Running like a Senior developer coded me!)"}
 
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    async def metrics() -> str:
+        """Connection pool and cache metrics in Prometheus text format."""
+        return render_prometheus(
+            [
+                *pool_metrics(pool_stats(engine), "primary"),
+                *(
+                    pool_metrics(pool_stats(replica_engine), "replica")
+                    if replica_engine is not None
+                    else []
+                ),
+                *cache_metrics(book_cache.stats(), "books"),
+                *cache_metrics(count_cache.stats(), "counts"),
+                *cache_metrics(principal_cache.stats(), "principals"),
+                *cache_metrics(token_cache.stats(), "tokens"),
+                *cache_metrics(idempotency_cache.stats(), "idempotency"),
+            ]
+        )
@@ -1,6 +1,8 @@
 from .book import Book
 from .user import User
 from .order import Order, OrderItem, OrderStatus
+from .payment import PAYMENT_IN_FLIGHT, PaymentAttempt, PaymentStatus
+from .statistics import BookSales, StatCounter
 
 __all__ = [
     "User",
@@ -10,4 +12,11 @@ __all__ = [
     "Order",
     "OrderItem",
     "OrderStatus",
+
+    "PaymentAttempt",
+    "PaymentStatus",
+    "PAYMENT_IN_FLIGHT",
+
+    "StatCounter",
+    "BookSales",
 ]
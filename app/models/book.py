@@ -1,8 +1,9 @@
 from decimal import Decimal
 from datetime import datetime
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, List, Optional
 
-from sqlalchemy import DateTime, Numeric, String, Text
+from sqlalchemy import Computed, DateTime, Index, Numeric, String, Text, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -13,19 +14,67 @@ if TYPE_CHECKING:
 
 class Book(Base):
     __tablename__ = "books"
+    __table_args__ = (
+        # === Keyset pagination, newest first ===
+        Index("ix_books_created_at_id", "created_at", "id"),
+        # === Catalog sort orders and price ranges ===
+        Index("ix_books_price_id", "price", "id"),
+        Index("ix_books_title_id", "title", "id"),
+        # === Same sort orders restricted to in-stock books ===
+        Index(
+            "ix_books_in_stock_created_at_id",
+            "created_at",
+            "id",
+            postgresql_where=text("stock_quantity > 0"),
+        ),
+        Index(
+            "ix_books_in_stock_price_id",
+            "price",
+            "id",
+            postgresql_where=text("stock_quantity > 0"),
+        ),
+        Index(
+            "ix_books_in_stock_title_id",
+            "title",
+            "id",
+            postgresql_where=text("stock_quantity > 0"),
+        ),
+        # === Search: full-text over title and description, ===
+        # === trigram matching of titles (needs pg_trgm) ===
+        Index("ix_books_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_books_title_trgm",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    title: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
+    title: Mapped[str] = mapped_column(String(255), nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=True)
     price: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
-    image_url: Mapped[str] = mapped_column(String(500), nullable=False)
+    image_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
     stock_quantity: Mapped[int] = mapped_column(default=0)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
+    # === Maintained by PostgreSQL, only used in ===
+    # === WHERE / ORDER BY of searches, never loaded ===
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+        deferred_raiseload=True,
+    )
+
     # Relationships
     order_items: Mapped[List["OrderItem"]] = relationship(
-        "OrderItem", back_populates="book", lazy="selectin"
+        "OrderItem", back_populates="book", lazy="raise"
     )
\ No newline at end of file
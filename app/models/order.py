@@ -4,7 +4,15 @@ from datetime import datetime
 from typing import TYPE_CHECKING, List
 
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import DateTime, Enum as SQLEnum, ForeignKey, Numeric, String
+from sqlalchemy import (
+    DateTime,
+    Enum as SQLEnum,
+    ForeignKey,
+    Index,
+    Numeric,
+    String,
+    text,
+)
 
 from app.database import Base
 
@@ -22,6 +30,17 @@ class OrderStatus(str, Enum):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # === Keyset pagination, newest first ===
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_user_id_created_at_id", "user_id", "created_at", "id"),
+        # === Orders the expiry sweeper may cancel, oldest first ===
+        Index(
+            "ix_orders_expirable_created_at",
+            "created_at",
+            postgresql_where=text("status IN ('PENDING', 'FAILED')"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
@@ -36,14 +55,18 @@ class Order(Base):
     )
 
     # Relationships
-    user: Mapped["User"] = relationship("User", back_populates="orders", lazy="selectin")
+    user: Mapped["User"] = relationship("User", back_populates="orders", lazy="raise")
     items: Mapped[List["OrderItem"]] = relationship(
-        "OrderItem", back_populates="order", lazy="selectin", cascade="all, delete-orphan"
+        "OrderItem", back_populates="order", lazy="raise", cascade="all, delete-orphan"
     )
 
 
 class OrderItem(Base):
     __tablename__ = "order_items"
+    __table_args__ = (
+        # === Items of orders: eager loading and the order export join ===
+        Index("ix_order_items_order_id", "order_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"), nullable=False)
@@ -52,5 +75,7 @@ class OrderItem(Base):
     price: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
 
     # Relationships
-    order: Mapped["Order"] = relationship("Order", back_populates="items")
-    book: Mapped["Book"] = relationship("Book", back_populates="order_items", lazy="selectin")
\ No newline at end of file
+    order: Mapped["Order"] = relationship("Order", back_populates="items", lazy="raise")
+    book: Mapped["Book"] = relationship(
+        "Book", back_populates="order_items", lazy="raise"
+    )
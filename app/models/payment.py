@@ -0,0 +1,50 @@
+from enum import Enum
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import DateTime, Enum as SQLEnum, ForeignKey, Index, String, text
+
+from app.database import Base
+
+
+class PaymentStatus(str, Enum):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    # === The gateway charged the card but the order ===
+    # === couldn't be paid, refund transaction_id ===
+    REFUND_PENDING = "refund_pending"
+
+
+# === Statuses of attempts the payment workers haven't finished ===
+PAYMENT_IN_FLIGHT = (PaymentStatus.QUEUED, PaymentStatus.PROCESSING)
+
+
+class PaymentAttempt(Base):
+    """One try to pay an order, processed by the payment workers off the request path"""
+    __tablename__ = "payment_attempts"
+    __table_args__ = (
+        # === At most one attempt per order is in flight ===
+        Index(
+            "ix_payment_attempts_in_flight_order_id",
+            "order_id",
+            unique=True,
+            postgresql_where=text("status IN ('QUEUED', 'PROCESSING')"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    order_id: Mapped[int] = mapped_column(
+        ForeignKey("orders.id"), nullable=False, index=True
+    )
+    status: Mapped[PaymentStatus] = mapped_column(
+        SQLEnum(PaymentStatus), default=PaymentStatus.QUEUED, nullable=False
+    )
+    message: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    transaction_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
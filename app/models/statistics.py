@@ -0,0 +1,22 @@
+from decimal import Decimal
+
+from sqlalchemy import ForeignKey, Numeric, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class StatCounter(Base):
+    """Admin statistics counter, kept up to date by the writes that change it"""
+    __tablename__ = "stat_counters"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[Decimal] = mapped_column(Numeric(14, 2), default=0, nullable=False)
+
+
+class BookSales(Base):
+    """Paid quantity per book, for the top selling books"""
+    __tablename__ = "book_sales"
+
+    book_id: Mapped[int] = mapped_column(ForeignKey("books.id"), primary_key=True)
+    total_sold: Mapped[int] = mapped_column(default=0, nullable=False, index=True)
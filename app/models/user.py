@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import TYPE_CHECKING, List
 
 from pydantic import EmailStr
-from sqlalchemy import Boolean, DateTime, String
+from sqlalchemy import Boolean, DateTime, Index, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -13,6 +13,10 @@ if TYPE_CHECKING:
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # === Keyset pagination, newest first ===
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     email: Mapped[EmailStr] = mapped_column(String(255), unique=True, index=True, nullable=False)
@@ -28,4 +32,6 @@ class User(Base):
     )
 
     # Relationships
-    orders: Mapped[List["Order"]] = relationship("Order", back_populates="user", lazy="selectin")
\ No newline at end of file
+    orders: Mapped[List["Order"]] = relationship(
+        "Order", back_populates="user", lazy="raise"
+    )
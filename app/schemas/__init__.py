@@ -1,7 +1,20 @@
-from .payment import PaymentRequest, PaymentResponse
-from .book import Book, BookCreate, BookList, BookUpdate
-from .order import Order, OrderCreate, OrderList, OrderItem
-from .user import Token, User, UserCreate, UserLogin, UserUpdate
+from .payment import PaymentAttempt, PaymentRequest
+from .book import (
+    Book,
+    BookCreate,
+    BookFilter,
+    BookImage,
+    BookImportError,
+    BookImportFormat,
+    BookImportResult,
+    BookList,
+    BookSearchHit,
+    BookSearchResults,
+    BookSort,
+    BookUpdate,
+)
+from .order import Order, OrderCreate, OrderExportFormat, OrderList, OrderItem
+from .user import Principal, Token, User, UserCreate, UserLogin, UserUpdate
 
 
 __all__ = [
@@ -10,17 +23,27 @@ __all__ = [
     "UserLogin",
     "UserCreate",
     "UserUpdate",
+    "Principal",
 
     "Book",
     "BookList",
     "BookCreate",
     "BookUpdate",
+    "BookSearchHit",
+    "BookSearchResults",
+    "BookFilter",
+    "BookSort",
+    "BookImportFormat",
+    "BookImportError",
+    "BookImportResult",
+    "BookImage",
 
     "Order",
     "OrderItem",
     "OrderList",
     "OrderCreate",
+    "OrderExportFormat",
 
     "PaymentRequest",
-    "PaymentResponse",
+    "PaymentAttempt",
 ]
\ No newline at end of file
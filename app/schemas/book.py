@@ -1,3 +1,4 @@
+from enum import Enum
 from decimal import Decimal
 from typing import Optional, Annotated
 from datetime import datetime
@@ -8,7 +9,7 @@ from pydantic import BaseModel, ConfigDict, Field, field_validator, condecimal
 class BookBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=255)
     description: Optional[str] = None
-    price: Decimal = Field(..., gt=0, decimal_places=2)
+    price: Decimal = Field(..., gt=0, max_digits=10, decimal_places=2)
     stock_quantity: int = Field(0, ge=0)
 
     @field_validator("price")
@@ -20,15 +21,15 @@ class BookBase(BaseModel):
 
 
 class BookCreate(BookBase):
-    image_url: Optional[str] = None
+    image_url: Optional[str] = Field(None, max_length=500)
 
 
 class BookUpdate(BaseModel):
-    title: Optional[str] = Field(None, min_length=1, max_length=255)
+    title: Optional[str] = Field(default=None, min_length=1, max_length=255)
     description: Optional[str] = None
     price: Optional[Annotated[Decimal, condecimal(gt=0, max_digits=10, decimal_places=2)]] = None
-    stock_quantity: Optional[int] = Field(None, ge=0)
-    image_url: Optional[str] = None
+    stock_quantity: Optional[int] = Field(default=None, ge=0)
+    image_url: Optional[str] = Field(default=None, max_length=500)
 
 
 class BookInDBBase(BookBase):
@@ -47,6 +48,63 @@ class Book(BookInDBBase):
 class BookList(BaseModel):
     books: list[Book]
     total: int
+    total_exact: bool = True
     page: int
     per_page: int
-    pages: int
\ No newline at end of file
+    pages: int
+    next_cursor: Optional[str] = None
+
+
+class BookSearchHit(Book):
+    rank: float
+
+
+class BookSearchResults(BaseModel):
+    books: list[BookSearchHit]
+    next_cursor: Optional[str] = None
+
+
+class BookSort(str, Enum):
+    NEWEST = "newest"
+    PRICE_ASC = "price_asc"
+    PRICE_DESC = "price_desc"
+    TITLE = "title"
+
+
+class BookFilter(BaseModel):
+    min_price: Optional[Decimal] = Field(default=None, ge=0)
+    max_price: Optional[Decimal] = Field(default=None, ge=0)
+    in_stock: bool = False
+    created_after: Optional[datetime] = None
+    sort: BookSort = BookSort.NEWEST
+
+    def is_filtered(self) -> bool:
+        """Check if any filter narrows the catalog, the sort order doesn't"""
+        return bool(
+            self.min_price is not None
+            or self.max_price is not None
+            or self.in_stock
+            or self.created_after is not None
+        )
+
+
+class BookImportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+class BookImportError(BaseModel):
+    line: int
+    errors: list[str]
+
+
+class BookImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: list[BookImportError]
+    errors_truncated: bool = False
+
+
+class BookImage(BaseModel):
+    book: Book
+    variants: dict[int, str]
@@ -1,3 +1,4 @@
+from enum import Enum
 from decimal import Decimal
 from datetime import datetime
 from typing import Optional, List
@@ -51,22 +52,13 @@ class Order(OrderBase):
 class OrderList(BaseModel):
     orders: List[Order]
     total: int
+    total_exact: bool = True
     page: int
     per_page: int
     pages: int
+    next_cursor: Optional[str] = None
 
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+class OrderExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
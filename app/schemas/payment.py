@@ -1,6 +1,9 @@
 from typing import Optional
+from datetime import datetime
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from app.models import PaymentStatus
 
 
 class PaymentRequest(BaseModel):
@@ -30,8 +33,13 @@ class PaymentRequest(BaseModel):
         return v
 
 
-class PaymentResponse(BaseModel):
-    success: bool
-    message: str
+class PaymentAttempt(BaseModel):
+    id: int
     order_id: int
-    transaction_id: Optional[str] = None
\ No newline at end of file
+    status: PaymentStatus
+    message: Optional[str] = None
+    transaction_id: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
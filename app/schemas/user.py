@@ -58,4 +58,15 @@ class Token(BaseModel):
 
 
 class TokenData(BaseModel):
-    username: Optional[str] = None
\ No newline at end of file
+    username: Optional[str] = None
+
+
+class Principal(BaseModel):
+    """Authenticated caller, only the fields needed to authorize requests"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+    id: int
+    username: str
+    is_active: bool
+    is_superuser: bool
+    is_banned: bool
@@ -1,11 +1,27 @@
+from .count import CountService
+from .loaders import LoadProfile
+from .statistics import StatisticsService
 from .user import UserService
 from .book import BookService
-from .order import OrderService
+from .book_import import BookImportService
+from .order import OrderService, PaymentInFlight
+from .payment import PaymentQueueFull, PaymentService
 
 __all__ = [
     "BookService",
+    "BookImportService",
+
+    "CountService",
+
+    "LoadProfile",
+
+    "StatisticsService",
 
     "OrderService",
+    "PaymentInFlight",
+
+    "PaymentService",
+    "PaymentQueueFull",
 
     "UserService",
 ]
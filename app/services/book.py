@@ -1,34 +1,213 @@
-from typing import List, Optional
+from decimal import Decimal
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
-from sqlalchemy import select, func
+from sqlalchemy import (
+    Double,
+    Integer,
+    cast,
+    column,
+    delete,
+    func,
+    inspect,
+    or_,
+    select,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.sql import Select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Book
-from app.schemas.book import BookCreate, BookUpdate
+from app.models import Book, StatCounter
+from app.config import settings
+from app.database import is_replica
+from app.utils.cache import TTLCache
+from app.utils.fields import select_columns
+from app.services.count import CountService
+from app.services.loaders import LoadProfile
+from app.services.statistics import CATALOG_VERSION, STOCK_VERSION, StatisticsService
+from app.utils.pagination import RankKeyset, decode_cursor, encode_cursor, keyset_page
+from app.schemas.book import BookCreate, BookFilter, BookSort, BookUpdate
 
 
+# === Column values of books by id, shared by all sessions of this process ===
+book_cache = TTLCache(maxsize=settings.BOOK_CACHE_MAXSIZE, ttl=settings.BOOK_CACHE_TTL)
+
+# === Catalog sort orders: keyset column, descending, ===
+# === how to read the column back from a cursor ===
+# === Each one is served by a (column, id) index, ===
+# === and by a partial one for in-stock books ===
+CATALOG_SORTS: Dict[BookSort, Tuple[Any, bool, Callable[[Any], Any]]] = {
+    BookSort.NEWEST: (Book.created_at, True, datetime.fromisoformat),
+    BookSort.PRICE_ASC: (Book.price, False, Decimal),
+    BookSort.PRICE_DESC: (Book.price, True, Decimal),
+    BookSort.TITLE: (Book.title, False, str),
+}
+
 
 class BookService:
     @staticmethod
     async def get(db: AsyncSession, book_id: int) -> Optional[Book]:
-        """Get a book by id"""
+        """Get a book by id, read through the book cache"""
+        if settings.BOOK_CACHE_ENABLED:
+            cached = book_cache.get(book_id)
+            if cached is not None:
+                # === Attach a copy to this session without ===
+                # === a query, so it can be updated as usual ===
+                cached_book = Book(**cached)
+                make_transient_to_detached(cached_book)
+                return await db.merge(cached_book, load=False)
+
+        result = await db.execute(
+            select(Book).where(Book.id == book_id).options(*LoadProfile.CATALOG)
+        )
+        book = result.scalar_one_or_none()
+
+        # === Rows from a lagging replica could put ===
+        # === back a version that was just invalidated ===
+        if book is not None and settings.BOOK_CACHE_ENABLED and not is_replica(db):
+            book_cache.set(book_id, BookService._to_cache(book))
+        return book
+
+    @staticmethod
+    def _to_cache(book: Book) -> Dict[str, Any]:
+        """Get column values of a book to keep in the cache"""
+        return {
+            attr.key: getattr(book, attr.key)
+            for attr in inspect(Book).column_attrs
+            if not attr.deferred
+        }
+
+    @staticmethod
+    def invalidate_cache(*book_ids: int) -> None:
+        """Drop books from the cache after they were changed"""
+        for book_id in book_ids:
+            book_cache.invalidate(book_id)
+
+    @staticmethod
+    async def get_many_for_update(
+        db: AsyncSession, book_ids: Iterable[int]
+    ) -> Dict[int, Book]:
+        """Get books by ids in one query, locking the rows until the transaction ends"""
         result = await db.execute(
-            select(Book).where(Book.id == book_id)
+            select(Book)
+            .where(Book.id.in_(set(book_ids)))
+            .order_by(Book.id)  # === lock in a stable order to avoid deadlocks ===
+            .with_for_update()
+            .execution_options(populate_existing=True)
         )
-        return result.scalar_one_or_none()
+        return {book.id: book for book in result.scalars().all()}
+
+    @staticmethod
+    def filter_query(query: Select, book_filter: BookFilter) -> Select:
+        """Narrow a books query down to the catalog filter"""
+        if book_filter.min_price is not None:
+            query = query.where(Book.price >= book_filter.min_price)
+        if book_filter.max_price is not None:
+            query = query.where(Book.price <= book_filter.max_price)
+        if book_filter.in_stock:
+            # === Same predicate as the partial in-stock ===
+            # === indexes, so the planner can use them ===
+            query = query.where(Book.stock_quantity > 0)
+        if book_filter.created_after is not None:
+            query = query.where(Book.created_at > book_filter.created_after)
+        return query
+
+    @staticmethod
+    def encode_cursor(sort: BookSort, book: Any) -> str:
+        """Encode the keyset of the last book of a page in the given sort order"""
+        sort_column = CATALOG_SORTS[sort][0]
+        return encode_cursor(getattr(book, sort_column.key), book.id, sort=sort.value)
+
+    @staticmethod
+    def decode_cursor(sort: BookSort, cursor: str) -> Optional[Tuple[Any, int]]:
+        """
+        Decode a cursor made by encode_cursor, None if
+        it is malformed or made for another sort order
+        """
+        return decode_cursor(cursor, parse=CATALOG_SORTS[sort][2], sort=sort.value)
 
     @staticmethod
-    async def get_multi(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Book]:
-        """Get multiple books in descending order"""
+    async def get_multi(
+        db: AsyncSession,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[Tuple[Any, int]] = None,
+        fields: Optional[Sequence[str]] = None,
+        book_filter: Optional[BookFilter] = None,
+    ) -> List[Any]:
+        """
+        Get multiple books, filtered and sorted (newest first
+        by default), by offset or after a keyset cursor.
+        With `fields` only those columns are selected
+        and rows are returned instead of books.
+        """
+        book_filter = book_filter or BookFilter()
+        sort_column, descending, _ = CATALOG_SORTS[book_filter.sort]
+
+        if fields is None:
+            query = select(Book).options(*LoadProfile.CATALOG)
+        else:
+            query = select(*select_columns(Book, [*fields, sort_column.key]))
+
+        query = BookService.filter_query(query, book_filter)
         result = await db.execute(
-            select(Book).offset(skip).limit(limit).order_by(Book.created_at.desc())
+            keyset_page(
+                query, sort_column, Book.id, skip, limit, after, descending=descending
+            )
+        )
+        return list(result.scalars().all() if fields is None else result.all())
+
+    @staticmethod
+    async def search(
+        db: AsyncSession, q: str, limit: int = 20, after: Optional[RankKeyset] = None
+    ) -> List[Any]:
+        """
+        Search books by full-text over title and
+        description, or by trigram similarity of the title,
+        so misspelled words still match. Both conditions are served by GIN indexes.
+
+        Hits are ordered by rank (text rank plus title
+        similarity), then id, and paged after a rank keyset.
+        Rows have the book columns and `rank`.
+        """
+        tsquery = func.websearch_to_tsquery("english", q)
+        # === Double so the rank survives a round trip through the cursor exactly ===
+        rank = cast(
+            func.ts_rank_cd(Book.search_vector, tsquery)
+            + func.word_similarity(q, Book.title),
+            Double,
+        )
+
+        columns = [
+            getattr(Book, attr.key)
+            for attr in inspect(Book).column_attrs
+            if not attr.deferred
+        ]
+        query = (
+            select(*columns, rank.label("rank"))
+            .where(or_(Book.search_vector.op("@@")(tsquery), Book.title.op("%>")(q)))
+            .order_by(rank.desc(), Book.id.desc())
+            .limit(limit)
         )
-        return list(result.scalars().all())
+        if after is not None:
+            query = query.where(tuple_(rank, Book.id) < after)
+
+        result = await db.execute(query)
+        return list(result.all())
 
     @staticmethod
-    async def get_total_count(db: AsyncSession) -> int:
-        """Get a total count of books"""
-        result = await db.execute(select(func.count(Book.id)))
+    async def get_total_count(
+        db: AsyncSession, book_filter: Optional[BookFilter] = None
+    ) -> int:
+        """Get a total count of books, of the filtered ones when a filter is given"""
+        query = select(func.count(Book.id))
+        if book_filter is not None:
+            query = BookService.filter_query(query, book_filter)
+        result = await db.execute(query)
         return result.scalar_one()
 
     @staticmethod
@@ -36,8 +215,12 @@ class BookService:
         """Create a new book"""
         book = Book(**book_create.model_dump())
         db.add(book)
+        await db.flush()
+        await BookService.bump_catalog_version(db)
         await db.commit()
         await db.refresh(book)
+
+        CountService.invalidate(Book.__tablename__)
         return book
 
     @staticmethod
@@ -48,40 +231,111 @@ class BookService:
         for f, v in updated_data.items():
             setattr(book, f, v)
 
+        await db.flush()
+        await BookService.bump_catalog_version(db)
         await db.commit()
         await db.refresh(book)
+
+        # === Price and stock are filters of the cached totals ===
+        BookService.invalidate_cache(book.id)
+        CountService.invalidate(Book.__tablename__)
         return book
 
     @staticmethod
     async def delete(db: AsyncSession, book: Book) -> Optional[Book]:
-        """Delete a book"""
-        pass
+        """
+        Delete a book, return None if it can't be deleted because it has been ordered
+        """
+        try:
+            await db.execute(delete(Book).where(Book.id == book.id))
+            await BookService.bump_catalog_version(db)
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return None
 
-    @staticmethod
-    async def check_stock(db: AsyncSession, book_id: int, quantity: int) -> bool:
-        """Check if a book has enough stocks"""
-        book = await BookService.get(db, book_id)
-        if not book:
-            return False
-        return book.stock_quantity >= quantity
+        BookService.invalidate_cache(book.id)
+        CountService.invalidate(Book.__tablename__)
+        return book
 
     @staticmethod
-    async def update_stock(db: AsyncSession, book_id: int, quantity_change: int) -> Optional[Book]:
-        """Update book stock (negative for deduction)"""
-        book = await BookService.get(db, book_id)
-        if not book:
-            return None
+    async def get_catalog_version(db: AsyncSession) -> Tuple[int, int]:
+        """
+        Get the catalog version and the stock version,
+        one changes whenever any book is added, changed or
+        removed, the other whenever orders deduct stock
+        """
+        result = await db.execute(
+            select(StatCounter.key, StatCounter.value).where(
+                StatCounter.key.in_((CATALOG_VERSION, STOCK_VERSION))
+            )
+        )
+        versions = dict(result.tuples().all())
+        return (
+            int(versions.get(CATALOG_VERSION, 0)),
+            int(versions.get(STOCK_VERSION, 0)),
+        )
 
-        new_quantity = book.stock_quantity + quantity_change
-        if new_quantity < 0:
-            return None
+    @staticmethod
+    async def bump_catalog_version(db: AsyncSession) -> None:
+        """
+        Bump the catalog version without committing.
+        Call it after the book rows were written, so
+        book rows are always locked before the counter.
+        """
+        await StatisticsService.increment(db, {CATALOG_VERSION: 1})
 
-        book.stock_quantity = new_quantity
+    @staticmethod
+    async def bump_stock_version(db: AsyncSession) -> None:
+        """
+        Bump the stock version in a transaction of its own and commit.
+        Call it once a deduction is committed, so payments never hold the counter row.
+        """
+        await StatisticsService.increment(db, {STOCK_VERSION: 1})
         await db.commit()
-        await db.refresh(book)
-        return book
 
+    @staticmethod
+    async def deduct_stock(db: AsyncSession, quantities: Dict[int, int]) -> List[int]:
+        """
+        Deduct stock of several books with one UPDATE
+        ... FROM (VALUES ...), without committing.
+        The rows are locked in id order first, like
+        `create` of orders does, so the two can't deadlock.
+        Rows are only updated when they still have enough
+        stock, so concurrent deductions can't oversell.
+        Versions are left alone, so the payment transaction locks no counter row.
+
+        Once the transaction is committed, call bump_stock_version, invalidate_cache
+        for the books and CountService.invalidate, in-stock totals may have changed.
+
+        :param quantities: mapping of book id to quantity to deduct
+        :return: ids of books that had not enough stock
+            (empty list when everything was deducted)
+        """
+        if not quantities:
+            return []
 
+        await db.execute(
+            select(Book.id)
+            .where(Book.id.in_(quantities.keys()))
+            .order_by(Book.id)
+            .with_for_update()
+        )
 
+        requested = values(
+            column("book_id", Integer), column("quantity", Integer), name="requested"
+        ).data(list(quantities.items()))
 
+        result = await db.execute(
+            update(Book)
+            .where(
+                Book.id == requested.c.book_id,
+                Book.stock_quantity >= requested.c.quantity,
+            )
+            .values(stock_quantity=Book.stock_quantity - requested.c.quantity)
+            .returning(Book.id)
+            .execution_options(synchronize_session=False)
+        )
+        deducted = set(result.scalars().all())
+        return [book_id for book_id in quantities if book_id not in deducted]
 
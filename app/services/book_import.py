@@ -0,0 +1,122 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Book
+from app.config import settings
+from app.services.book import BookService
+from app.services.count import CountService
+from app.schemas.book import BookCreate, BookImportFormat
+from app.utils.records import iter_csv_records, iter_ndjson_records
+
+# === Columns loaded by COPY, in the order of the records ===
+IMPORT_COLUMNS = [
+    "title",
+    "description",
+    "price",
+    "image_url",
+    "stock_quantity",
+    "created_at",
+    "updated_at",
+]
+
+
+class BookImportService:
+    @staticmethod
+    async def import_stream(
+        db: AsyncSession, chunks: AsyncIterator[bytes], fmt: BookImportFormat
+    ) -> Dict[str, Any]:
+        """
+        Import books from a CSV or NDJSON byte stream.
+        Rows are validated with BookCreate and every
+        IMPORT_BATCH_SIZE valid rows are loaded with COPY
+        and committed, so memory stays constant whatever the size of the stream.
+        Invalid rows are skipped and reported, up to IMPORT_MAX_ERRORS of them.
+        """
+        if fmt == BookImportFormat.CSV:
+            records = iter_csv_records(chunks)
+        else:
+            records = iter_ndjson_records(chunks)
+
+        imported = failed = 0
+        errors: List[Dict[str, Any]] = []
+        batch: List[Tuple[Any, ...]] = []
+
+        async for line, record in records:
+            if isinstance(record, str):
+                messages = [record]
+            else:
+                try:
+                    book = BookCreate.model_validate(
+                        BookImportService._clean(record, fmt)
+                    )
+                except ValidationError as e:
+                    messages = [
+                        f"{'.'.join(str(part) for part in error['loc'])}: "
+                        f"{error['msg']}"
+                        for error in e.errors()
+                    ]
+                else:
+                    batch.append(
+                        (
+                            book.title,
+                            book.description,
+                            book.price,
+                            book.image_url,
+                            book.stock_quantity,
+                        )
+                    )
+                    if len(batch) >= settings.IMPORT_BATCH_SIZE:
+                        imported += await BookImportService._load(db, batch)
+                        batch = []
+                    continue
+
+            failed += 1
+            if len(errors) < settings.IMPORT_MAX_ERRORS:
+                errors.append({"line": line, "errors": messages})
+
+        if batch:
+            imported += await BookImportService._load(db, batch)
+
+        return {
+            "imported": imported,
+            "failed": failed,
+            "errors": errors,
+            "errors_truncated": failed > len(errors),
+        }
+
+    @staticmethod
+    def _clean(record: Dict[str, Any], fmt: BookImportFormat) -> Dict[str, Any]:
+        # === Empty CSV cells mean "not given", so ===
+        # === optional fields get their defaults ===
+        if fmt == BookImportFormat.CSV:
+            return {key: value for key, value in record.items() if value != ""}
+        return record
+
+    @staticmethod
+    async def _load(db: AsyncSession, batch: List[Tuple[Any, ...]]) -> int:
+        """
+        Load a batch of validated rows with COPY and
+        commit, return the number of rows loaded
+        """
+        # === Bumping first opens the transaction, so COPY ===
+        # === runs inside it instead of committing on its own ===
+        await BookService.bump_catalog_version(db)
+
+        now = datetime.utcnow()
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+        if driver_connection is None:
+            raise RuntimeError("Database connection was closed before COPY")
+        await driver_connection.copy_records_to_table(
+            Book.__tablename__,
+            columns=IMPORT_COLUMNS,
+            records=[(*row, now, now) for row in batch],
+        )
+        await db.commit()
+
+        CountService.invalidate(Book.__tablename__)
+        return len(batch)
@@ -0,0 +1,89 @@
+from enum import Enum
+from typing import Awaitable, Callable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.utils.cache import TTLCache
+
+
+class CountMode(str, Enum):
+    EXACT = "exact"
+    CACHED = "cached"
+    ESTIMATED = "estimated"
+
+
+# === Totals of list endpoints, keyed by (table, *filters) ===
+count_cache = TTLCache(
+    maxsize=settings.COUNT_CACHE_MAXSIZE, ttl=settings.COUNT_CACHE_TTL
+)
+
+
+class CountService:
+    @staticmethod
+    async def get_total(
+        db: AsyncSession,
+        mode: str,
+        key: Tuple,
+        exact_count: Callable[[], Awaitable[int]],
+    ) -> Tuple[int, bool]:
+        """
+        Get a total for a list endpoint.
+
+        :param mode: exact, cached or estimated, see CountMode
+        :param key: cache key, starting with the table name
+        :param exact_count: coroutine factory running the exact COUNT query
+        :return: Tuple of (total, whether total is exact)
+        """
+        mode = CountMode(mode)
+
+        # === Planner statistics can only estimate unfiltered tables ===
+        if mode == CountMode.ESTIMATED and len(key) == 1:
+            estimate = await CountService.estimate(db, key[0])
+            if estimate is not None:
+                return estimate, False
+
+        if mode == CountMode.CACHED:
+            cached = count_cache.get(key)
+            if cached is not None:
+                return cached, False
+
+        total = await exact_count()
+        if mode == CountMode.CACHED:
+            count_cache.set(key, total)
+        return total, True
+
+    @staticmethod
+    async def estimate(db: AsyncSession, table: str) -> Optional[int]:
+        """
+        Get estimated row count of a table from
+        pg_class, None if the table was never analyzed
+        """
+        result = await db.execute(
+            text(
+                "SELECT reltuples::bigint FROM pg_class "
+                "WHERE oid = CAST(:table AS regclass)"
+            ),
+            {"table": table},
+        )
+        estimate = result.scalar_one_or_none()
+        if estimate is None or estimate < 0:
+            return None
+        return estimate
+
+    @staticmethod
+    def invalidate(table: str) -> None:
+        """Drop cached totals of a table after rows were added or removed"""
+        count_cache.invalidate_where(
+            lambda key: isinstance(key, tuple) and key[0] == table
+        )
+
+    @staticmethod
+    def invalidate_keys(*keys: Tuple) -> None:
+        """
+        Drop the given cached totals, cheaper than
+        invalidate when the changed keys are known
+        """
+        for key in keys:
+            count_cache.invalidate(key)
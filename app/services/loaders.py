@@ -0,0 +1,31 @@
+from sqlalchemy.orm import selectinload
+
+from app.models import Order, OrderItem
+
+
+class LoadProfile:
+    """
+    Relationship loading options, picked per query.
+    Relationships on the models are lazy="raise",
+    so a query only loads what its profile asks for
+    and touching anything else fails loudly instead of running hidden queries.
+    """
+    # === Book lists and pages: book columns only ===
+    CATALOG = ()
+
+    # === Order columns only, e.g. to check its owner and status ===
+    ORDER = ()
+
+    # === Order with its items, e.g. to deduct stock on payment ===
+    ORDER_ITEMS = (
+        selectinload(Order.items),
+    )
+
+    # === Order with items, their books and the buyer, as in the Order schema ===
+    ORDER_DETAIL = (
+        selectinload(Order.items).selectinload(OrderItem.book),
+        selectinload(Order.user),
+    )
+
+    # === Admin order lists, same shape as order detail ===
+    ADMIN_ORDERS = ORDER_DETAIL
@@ -1,113 +1,357 @@
+import asyncio
+import logging
 from decimal import Decimal
-from typing import Optional, List
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Optional, List, Sequence, Tuple
 
-from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Exists, Row, Select, exists, select, func, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import InstrumentedAttribute
 
 from app.schemas import OrderCreate
 from app.services import BookService
-from app.models import User, Order, OrderItem, OrderStatus
+from app.services.count import CountService
+from app.services.loaders import LoadProfile
+from app.services.statistics import StatisticsService, orders_status_key
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models import (
+    PAYMENT_IN_FLIGHT,
+    Book,
+    Order,
+    OrderItem,
+    OrderStatus,
+    PaymentAttempt,
+    User,
+)
+from app.utils.fields import select_columns
+from app.utils.pagination import Keyset, keyset_page
+
+logger = logging.getLogger(__name__)
+
+# === Unpaid orders, they may be cancelled, by their owner or the expiry sweeper ===
+EXPIRABLE_STATUSES = (OrderStatus.PENDING, OrderStatus.FAILED)
+
+
+class PaymentInFlight(ValueError):
+    """The order has a payment attempt the payment workers haven't finished"""
+
+
+# === Columns of the order export, one row per order item ===
+EXPORT_COLUMNS: Tuple[Tuple[str, InstrumentedAttribute[Any]], ...] = (
+    ("order_id", Order.id),
+    ("created_at", Order.created_at),
+    ("status", Order.status),
+    ("user_id", Order.user_id),
+    ("username", User.username),
+    ("total_amount", Order.total_amount),
+    ("item_id", OrderItem.id),
+    ("book_id", OrderItem.book_id),
+    ("book_title", Book.title),
+    ("quantity", OrderItem.quantity),
+    ("price", OrderItem.price),
+)
 
 
 class OrderService:
     @staticmethod
-    async def get(db: AsyncSession, order_id: int) -> Optional[Order]:
-        """Get order by ID with all relationships"""
+    async def get(
+        db: AsyncSession,
+        order_id: int,
+        profile: Sequence[Any] = LoadProfile.ORDER_DETAIL,
+    ) -> Optional[Order]:
+        """Get order by ID with relationships of the given load profile"""
         result = await db.execute(
-            select(Order).where(Order.id == order_id).options(
-                selectinload(Order.items).selectinload(OrderItem.book),
-                selectinload(Order.user)
-            )
+            select(Order).where(Order.id == order_id).options(*profile)
         )
         return result.scalar_one_or_none()
 
     @staticmethod
-    async def get_user_orders(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100) -> List[Order]:
-        """Get orders for a specific user"""
+    async def get_user_orders(
+        db: AsyncSession,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[Keyset] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Any]:
+        """
+        Get orders for a specific user.
+        With `fields` only those columns are selected
+        and rows are returned instead of orders.
+        """
+        query = OrderService._list_query(LoadProfile.ORDER_DETAIL, fields)
         result = await db.execute(
-            select(Order).where(User.id == user_id).options(
-                selectinload(Order.items).selectinload(OrderItem.book),
-                selectinload(Order.user)
+            keyset_page(
+                query.where(Order.user_id == user_id),
+                Order.created_at,
+                Order.id,
+                skip,
+                limit,
+                after,
             )
-            .offset(skip)
-            .limit(limit)
-            .order_by(Order.created_at.desc())
         )
-        return list(result.scalars().all())
+        return list(result.scalars().all() if fields is None else result.all())
 
     @staticmethod
-    async def get_all_orders(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Order]:
-        """Get all orders (admin only)"""
+    async def get_all_orders(
+        db: AsyncSession,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[Keyset] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Any]:
+        """
+        Get all orders (admin only).
+        With `fields` only those columns are selected
+        and rows are returned instead of orders.
+        """
+        query = OrderService._list_query(LoadProfile.ADMIN_ORDERS, fields)
         result = await db.execute(
-            select(Order).options(
-                selectinload(Order.items).selectinload(OrderItem.book),
-                selectinload(Order.user)
-            )
-            .offset(skip)
-            .limit(limit)
-            .order_by(Order.created_at.desc())
+            keyset_page(query, Order.created_at, Order.id, skip, limit, after)
+        )
+        return list(result.scalars().all() if fields is None else result.all())
+
+    @staticmethod
+    def _list_query(profile: Sequence[Any], fields: Optional[Sequence[str]]) -> Select:
+        """Select whole orders with the load profile, or only the given columns"""
+        if fields is None:
+            return select(Order).options(*profile)
+        return select(*select_columns(Order, fields))
+
+    @staticmethod
+    async def stream_export(
+        db: AsyncSession,
+        status: Optional[OrderStatus] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Stream flat order item rows (see EXPORT_COLUMNS),
+        oldest orders first, in batches of `batch_size`.
+        Rows come from a server-side cursor, so only one batch is held in memory.
+        """
+        query = (
+            select(*(column.label(name) for name, column in EXPORT_COLUMNS))
+            .select_from(Order)
+            .join(User, User.id == Order.user_id)
+            .join(OrderItem, OrderItem.order_id == Order.id)
+            .join(Book, Book.id == OrderItem.book_id)
+            .order_by(Order.created_at, Order.id, OrderItem.id)
+            .execution_options(yield_per=batch_size)
         )
-        return list(result.scalars().all())
+        if status is not None:
+            query = query.where(Order.status == status)
+        if created_after is not None:
+            query = query.where(Order.created_at >= created_after)
+        if created_before is not None:
+            query = query.where(Order.created_at < created_before)
+
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            yield rows
 
     @staticmethod
     async def get_total_count(db: AsyncSession, user_id: Optional[int] = None) -> int:
         """Get a total count of orders"""
         query = select(func.count(Order.id))
         if user_id:
-            query = query.where(User.id == user_id)
+            query = query.where(Order.user_id == user_id)
         result = await db.execute(query)
         return result.scalar_one()
 
     @staticmethod
-    async def create(db: AsyncSession, user: User, order_create: OrderCreate) -> Optional[Order]:
+    async def create(
+        db: AsyncSession, user_id: int, order_create: OrderCreate
+    ) -> Optional[Order]:
         """Create a new order"""
-        # === Calculate total amount and check stock first ===
-        total_amount = Decimal("0.00")
-        order_items = []
-
+        # === Sum quantities per book, so repeated lines are checked together ===
+        quantities: Dict[int, int] = defaultdict(int)
         for item in order_create.items:
-            # == get book and check stock ===
-            book = await BookService.get(db, item.book_id)
-            if not book:
-                return None
-
-            if not await BookService.check_stock(db, item.book_id, item.quantity):
-                return None
+            quantities[item.book_id] += item.quantity
 
-            # === Calculate item total ===
-            item_total = book.price * item.quantity
-            total_amount += item_total
+        # === Get and lock all requested books in one query ===
+        books = await BookService.get_many_for_update(db, quantities.keys())
+        if len(books) != len(quantities):
+            await db.rollback()
+            return None
 
-            # === Create order item ===
-            order_item = OrderItem(
-                book_id=item.book_id,
-                quantity=item.quantity,
-                price=book.price,
-            )
-            order_items.append(order_item)
+        # === Check stock and calculate total amount in memory ===
+        total_amount = Decimal("0.00")
+        for book_id, quantity in quantities.items():
+            book = books[book_id]
+            if book.stock_quantity < quantity:
+                await db.rollback()
+                return None
+            total_amount += book.price * quantity
 
-        # === Create an order ===
+        # === Create an order with all of its items ===
         order = Order(
-            user_id=user.id,
+            user_id=user_id,
             total_amount=total_amount,
             status=OrderStatus.PENDING,
-            items=order_items
+            items=[
+                OrderItem(
+                    book_id=item.book_id,
+                    quantity=item.quantity,
+                    price=books[item.book_id].price,
+                )
+                for item in order_create.items
+            ],
         )
 
         db.add(order)
+        await StatisticsService.record_order_created(db, order)
         await db.commit()
-        await db.refresh(order)
+
+        # === Only the total of all orders and this user's total changed ===
+        CountService.invalidate_keys(
+            (Order.__tablename__,), (Order.__tablename__, user_id)
+        )
 
         # === Load relationships ===
         result = await db.execute(
-            select(Order).where(Order.id == order.id).options(
-                selectinload(Order.items).selectinload(OrderItem.book),
-                selectinload(Order.user)
-            )
+            select(Order).where(Order.id == order.id)
+            .options(*LoadProfile.ORDER_DETAIL)
+            .execution_options(populate_existing=True)
         )
         return result.scalar_one()
 
+    @staticmethod
+    def _set_status(
+        order: Order, status: OrderStatus, card_number: Optional[str] = None
+    ) -> None:
+        """Set status of an order without committing"""
+        order.status = status
+        if card_number:
+            #  ==== Mask card number for security ===
+            order.payment_card_number = f"****{card_number[-4:]}"
+
+    @staticmethod
+    def payment_in_flight(order_id: Any) -> Exists:
+        """
+        EXISTS clause of an unfinished payment attempt of an order.
+        Attempts older than PAYMENT_ATTEMPT_TIMEOUT
+        were lost with their process and don't count.
+        """
+        attempt_cutoff = datetime.utcnow() - timedelta(
+            seconds=settings.PAYMENT_ATTEMPT_TIMEOUT
+        )
+        return exists().where(
+            PaymentAttempt.order_id == order_id,
+            PaymentAttempt.status.in_(PAYMENT_IN_FLIGHT),
+            PaymentAttempt.created_at >= attempt_cutoff,
+        )
+
+    @staticmethod
+    async def cancel(db: AsyncSession, order_id: int) -> Optional[Order]:
+        """
+        Cancel a PENDING or FAILED order, with the order locked
+        so a payment settling meanwhile isn't overwritten.
+        Return None if the order can't be cancelled (anymore).
+
+        :raises PaymentInFlight: a payment of the order is being processed
+        """
+        result = await db.execute(
+            select(Order, OrderService.payment_in_flight(order_id))
+            .where(Order.id == order_id)
+            .with_for_update(of=Order)
+            .execution_options(populate_existing=True)
+        )
+        order, in_flight = result.one()
+        if order.status not in EXPIRABLE_STATUSES:
+            await db.rollback()
+            return None
+        if in_flight:
+            await db.rollback()
+            raise PaymentInFlight()
+
+        await OrderService.update_status(db, order, OrderStatus.CANCELLED)
+        return await OrderService.get(db, order_id)
+
+    @staticmethod
+    async def expire_batch(db: AsyncSession, cutoff: datetime, batch_size: int) -> int:
+        """
+        Cancel up to batch_size PENDING or FAILED orders
+        created before cutoff with one UPDATE, and commit.
+        Orders locked by live requests and orders with a payment in flight are skipped.
+
+        :return: number of cancelled orders
+        """
+        expired = (
+            select(Order.id, Order.status)
+            .where(
+                Order.status.in_(EXPIRABLE_STATUSES),
+                Order.created_at < cutoff,
+                ~OrderService.payment_in_flight(Order.id),
+            )
+            .order_by(Order.created_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .cte("expired")
+        )
+        result = await db.execute(
+            update(Order)
+            .where(Order.id == expired.c.id)
+            .values(status=OrderStatus.CANCELLED, updated_at=datetime.utcnow())
+            .returning(expired.c.status)
+            .execution_options(synchronize_session=False)
+        )
+        old_statuses = Counter(status for status, in result)
+
+        # === Move the cancelled orders between ===
+        # === status counters in the same transaction ===
+        cancelled = sum(old_statuses.values())
+        deltas: Dict[str, int] = {orders_status_key(OrderStatus.CANCELLED): cancelled}
+        for status, count in old_statuses.items():
+            deltas[orders_status_key(status)] = -count
+        await StatisticsService.increment(db, deltas)
+
+        await db.commit()
+        return cancelled
+
+    @staticmethod
+    async def expire_stale(
+        expire_after: int,
+        batch_size: int,
+        pause: float,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+    ) -> int:
+        """
+        Cancel PENDING and FAILED orders older
+        than expire_after seconds, batch by batch,
+        pausing between batches so live traffic isn't held up by the sweep.
+
+        :return: number of cancelled orders
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=expire_after)
+        total = 0
+        async with session_factory() as db:
+            while True:
+                cancelled = await OrderService.expire_batch(db, cutoff, batch_size)
+                total += cancelled
+                if cancelled < batch_size:
+                    return total
+                await asyncio.sleep(pause)
+
+    @staticmethod
+    async def expire_forever(interval: int) -> None:
+        """Sweep expired orders every `interval` seconds"""
+        while True:
+            try:
+                cancelled = await OrderService.expire_stale(
+                    settings.ORDER_EXPIRE_AFTER,
+                    settings.ORDER_EXPIRY_BATCH_SIZE,
+                    settings.ORDER_EXPIRY_BATCH_PAUSE,
+                )
+                if cancelled:
+                    logger.info("Cancelled %s expired orders", cancelled)
+            except Exception:
+                logger.exception("Order expiry sweep failed")
+            await asyncio.sleep(interval)
+
     @staticmethod
     async def update_status(
         db: AsyncSession,
@@ -116,73 +360,43 @@ class OrderService:
         card_number: Optional[str] = None
     ) -> Optional[Order]:
         """Update status of an order"""
-        order.status = status
-        if card_number:
-            #  ==== Mask card number for security ===
-            order.payment_card_number = f"****{card_number[-4:]}"
+        old_status = order.status
+        OrderService._set_status(order, status, card_number)
+        await StatisticsService.record_status_change(db, order, old_status)
 
         await db.commit()
         await db.refresh(order)
         return order
 
     @staticmethod
-    async def process_payment_success(db: AsyncSession, order: Order, card_number: str) -> Order:
-        """Process success payment for an order"""
-        # === update order status ==
-        order = await OrderService.update_status(
-            db, order, OrderStatus.PAID, card_number
-        )
+    async def process_payment_success(
+        db: AsyncSession, order: Order, card_number: str
+    ) -> Tuple[Optional[Order], List[int]]:
+        """
+        Process success payment for an order.
+        Status change and stock deduction are committed together, or not at all.
 
-        # === Update book stock ===
+        :return: Tuple of (paid order or None, ids of books that were out of stock)
+        """
+        quantities: Dict[int, int] = defaultdict(int)
         for item in order.items:
-            await BookService.update_stock(db, item.book_id, -item.quantity)
+            quantities[item.book_id] += item.quantity
 
-        return order
-
-    @staticmethod
-    async def get_statistics(db: AsyncSession) -> dict:
-        """Get statistics for admin only"""
-        # === Total Orders ==
-        total_orders_result = await db.execute(select(func.count(Order.id)))
-        total_orders = total_orders_result.scalar_one()
-
-        # === Total revenue ===
-        total_revenue_result = await db.execute(
-            select(func.sum(Order.total_amount)).where(Order.status == OrderStatus.PAID)
-        )
-        total_revenue = total_revenue_result.scalar_one() or Decimal("0.00")
-
-        # === Order by status ===
-        status_counts_result = await db.execute(
-            select(Order.status, func.count(Order.id)).group_by(Order.status)
-        )
-        status_counts = {
-            status: count for status, count in status_counts_result
-        }
-
-        # === Top Selling Books ===
-        top_books_result = await db.execute(
-            select(
-                OrderItem.book_id,
-                func.sum(OrderItem.quantity).label("total_quantity")
-            )
-            .join(Order)
-            .where(Order.status == OrderStatus.PAID)
-            .group_by(OrderItem.book_id)
-            .order_by(func.sum(OrderItem.quantity).desc())
-            .limit(5)
-        )
-        top_books = [
-            {"book_id": book_id, "total_sold": quantity}
-            for book_id, quantity in top_books_result
-        ]
-
-        return {
-            "total_orders": total_orders,
-            "total_revenue": total_revenue,
-            "order_by_status": status_counts,
-            "top_books": top_books,
-        }
+        # === Deduct stock of all items in one statement ===
+        short_book_ids = await BookService.deduct_stock(db, quantities)
+        if short_book_ids:
+            await db.rollback()
+            return None, short_book_ids
 
+        # === Update order status and statistics in the same transaction ===
+        old_status = order.status
+        OrderService._set_status(order, OrderStatus.PAID, card_number)
+        await StatisticsService.record_status_change(db, order, old_status, quantities)
 
+        await db.commit()
+        await BookService.bump_stock_version(db)
+        await db.refresh(order)
 
+        BookService.invalidate_cache(*quantities)
+        CountService.invalidate(Book.__tablename__)
+        return order, []
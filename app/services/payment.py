@@ -0,0 +1,348 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.payment import process_payment
+from app.database import AsyncSessionLocal
+from app.models import (
+    PAYMENT_IN_FLIGHT,
+    Order,
+    OrderStatus,
+    PaymentAttempt,
+    PaymentStatus,
+)
+from app.services.loaders import LoadProfile
+from app.services.order import OrderService
+
+logger = logging.getLogger(__name__)
+
+# === Long polls of attempts queued by another process ===
+# === check the database this often, in seconds ===
+POLL_INTERVAL = 0.5
+
+
+class PaymentQueueFull(Exception):
+    """The payment queue of this process takes no more attempts"""
+
+
+class QueuedPayment(NamedTuple):
+    attempt_id: int
+    order_id: int
+    # === Never stored, only kept in memory until the gateway call ===
+    card_number: str
+
+
+# === Attempts waiting for a worker, created when the workers start ===
+_queue: Optional["asyncio.Queue[QueuedPayment]"] = None
+
+# === Set when an attempt queued by this process is finished, for long polls ===
+_finished: Dict[int, asyncio.Event] = {}
+
+
+class PaymentService:
+    """
+    Payments run off the request path: `enqueue` records an attempt and queues it,
+    workers take attempts off the queue in batches, call
+    the gateway concurrently and settle the orders.
+    """
+
+    @staticmethod
+    async def enqueue(
+        db: AsyncSession, order: Order, card_number: str
+    ) -> Optional[PaymentAttempt]:
+        """
+        Record a payment attempt of an order and queue it.
+        Return None if the order already has an attempt in flight.
+
+        :raises PaymentQueueFull: the queue is full, or no workers run in this process
+        """
+        queue = _queue
+        if queue is None or queue.full():
+            raise PaymentQueueFull()
+
+        # === An attempt lost with a restarted ===
+        # === process doesn't block the order forever ===
+        await PaymentService.fail_stale(db, PaymentAttempt.order_id == order.id)
+
+        attempt = PaymentAttempt(order_id=order.id, status=PaymentStatus.QUEUED)
+        db.add(attempt)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return None
+        await db.refresh(attempt)
+
+        _finished[attempt.id] = asyncio.Event()
+        try:
+            queue.put_nowait(QueuedPayment(attempt.id, order.id, card_number))
+        except asyncio.QueueFull:
+            _finished.pop(attempt.id)
+            attempt.status = PaymentStatus.FAILED
+            attempt.message = "Payment queue is full, please retry"
+            await db.commit()
+            raise PaymentQueueFull()
+        return attempt
+
+    @staticmethod
+    async def get_attempt(
+        db: AsyncSession, order_id: int, attempt_id: int
+    ) -> Optional[PaymentAttempt]:
+        """Get a payment attempt of an order"""
+        result = await db.execute(
+            select(PaymentAttempt).where(
+                PaymentAttempt.id == attempt_id, PaymentAttempt.order_id == order_id
+            )
+        )
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def wait(
+        db: AsyncSession, attempt: PaymentAttempt, timeout: float
+    ) -> PaymentAttempt:
+        """
+        Wait up to `timeout` seconds for an attempt
+        to finish and return it as it is then.
+        No connection is held while waiting.
+        """
+        if await PaymentService.fail_stale(db, PaymentAttempt.id == attempt.id):
+            await db.commit()
+            await db.refresh(attempt)
+
+        attempt_id = attempt.id
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while attempt.status in PAYMENT_IN_FLIGHT:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            # === Ending the transaction gives the connection back to the pool ===
+            await db.rollback()
+            event = _finished.get(attempt_id)
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), remaining)
+                else:
+                    await asyncio.sleep(min(POLL_INTERVAL, remaining))
+            except asyncio.TimeoutError:
+                pass
+            await db.refresh(attempt)
+        return attempt
+
+    @staticmethod
+    async def fail_stale(db: AsyncSession, *criteria: Any) -> int:
+        """
+        Fail in-flight attempts older than PAYMENT_ATTEMPT_TIMEOUT without committing,
+        their process was restarted before finishing them.
+
+        :return: number of failed attempts
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.PAYMENT_ATTEMPT_TIMEOUT)
+        result = await db.execute(
+            update(PaymentAttempt)
+            .where(
+                PaymentAttempt.status.in_(PAYMENT_IN_FLIGHT),
+                PaymentAttempt.created_at < cutoff,
+                *criteria,
+            )
+            .values(
+                status=PaymentStatus.FAILED,
+                message="Payment was interrupted, please retry",
+            )
+        )
+        return result.rowcount
+
+    @staticmethod
+    def start_workers(count: int) -> List[asyncio.Task]:
+        """
+        Create the payment queue and start workers on
+        it, cancel the returned tasks to stop them
+        """
+        global _queue
+        _queue = asyncio.Queue(maxsize=settings.PAYMENT_QUEUE_SIZE)
+        return [asyncio.create_task(PaymentService._work(_queue)) for _ in range(count)]
+
+    @staticmethod
+    async def _work(queue: "asyncio.Queue[QueuedPayment]") -> None:
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < settings.PAYMENT_BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            try:
+                await PaymentService._process_batch(batch)
+            except Exception:
+                logger.exception("Payment batch failed")
+            finally:
+                for payment in batch:
+                    queue.task_done()
+                    event = _finished.pop(payment.attempt_id, None)
+                    if event is not None:
+                        event.set()
+
+    @staticmethod
+    async def _process_batch(batch: List[QueuedPayment]) -> None:
+        # === Only attempts young enough to finish their gateway call ===
+        # === before fail_stale would fail them are claimed ===
+        cutoff = datetime.utcnow() - timedelta(
+            seconds=settings.PAYMENT_ATTEMPT_TIMEOUT - settings.PAYMENT_CALL_TIMEOUT
+        )
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(PaymentAttempt)
+                .where(
+                    PaymentAttempt.id.in_([payment.attempt_id for payment in batch]),
+                    PaymentAttempt.status == PaymentStatus.QUEUED,
+                    PaymentAttempt.created_at >= cutoff,
+                )
+                .values(status=PaymentStatus.PROCESSING)
+                .returning(PaymentAttempt.id)
+            )
+            claimed = set(result.scalars().all())
+            await db.commit()
+
+        # === Attempts failed as stale or claimed elsewhere are never charged ===
+        batch = [payment for payment in batch if payment.attempt_id in claimed]
+        if not batch:
+            return
+
+        # === Gateway calls of the batch run concurrently, ===
+        # === no connection is held meanwhile ===
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(
+                    process_payment(payment.card_number), settings.PAYMENT_CALL_TIMEOUT
+                )
+                for payment in batch
+            ),
+            return_exceptions=True,
+        )
+
+        async with AsyncSessionLocal() as db:
+            for payment, result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    logger.error("Payment gateway call failed", exc_info=result)
+                    result = (False, "Payment gateway error, please retry", "")
+                try:
+                    await PaymentService._settle(db, payment, result)
+                except Exception:
+                    logger.exception(
+                        "Settling payment attempt %s failed", payment.attempt_id
+                    )
+                    await db.rollback()
+
+    @staticmethod
+    async def _lock(
+        db: AsyncSession, payment: QueuedPayment
+    ) -> Tuple[Order, Optional[PaymentAttempt]]:
+        """
+        Lock the order, then its attempt, it may have
+        been cancelled while the gateway was busy
+        """
+        order_result = await db.execute(
+            select(Order)
+            .where(Order.id == payment.order_id)
+            .options(*LoadProfile.ORDER_ITEMS)
+            .with_for_update(of=Order)
+            .execution_options(populate_existing=True)
+        )
+        attempt_result = await db.execute(
+            select(PaymentAttempt)
+            .where(
+                PaymentAttempt.id == payment.attempt_id,
+                PaymentAttempt.status.in_(PAYMENT_IN_FLIGHT),
+            )
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        return order_result.scalar_one(), attempt_result.scalar_one_or_none()
+
+    @staticmethod
+    async def _settle(
+        db: AsyncSession, payment: QueuedPayment, result: Tuple[bool, str, str]
+    ) -> None:
+        """Apply a gateway result to the order and the attempt, and commit"""
+        success, message, transaction_id = result
+
+        order, attempt = await PaymentService._lock(db, payment)
+        if attempt is None:
+            # === Failed as stale meanwhile ===
+            await PaymentService._keep_lost_charge(db, payment, result)
+            return
+
+        if order.status != OrderStatus.PENDING:
+            message = f"Order is {order.status.value}, the payment was not applied"
+        elif success:
+            # === Status, stock and the attempt are committed together ===
+            attempt.status = PaymentStatus.SUCCEEDED
+            attempt.message = message
+            attempt.transaction_id = transaction_id
+            _, short_book_ids = await OrderService.process_payment_success(
+                db, order, payment.card_number
+            )
+            if not short_book_ids:
+                return
+
+            # === Rolled back, lock again before failing the order ===
+            message = (
+                "Payment failed. Not enough stock for books: "
+                f"{', '.join(map(str, short_book_ids))}"
+            )
+            order, attempt = await PaymentService._lock(db, payment)
+            if attempt is None:
+                await PaymentService._keep_lost_charge(db, payment, result)
+                return
+
+        if success:
+            # === Charged but not applied, the transaction ===
+            # === is kept so it can be refunded ===
+            attempt.status = PaymentStatus.REFUND_PENDING
+            attempt.message = f"{message}. The charge will be refunded"
+            attempt.transaction_id = transaction_id
+        else:
+            attempt.status = PaymentStatus.FAILED
+            attempt.message = message
+            attempt.transaction_id = None
+        if order.status == OrderStatus.PENDING:
+            await OrderService.update_status(
+                db, order, OrderStatus.FAILED, payment.card_number
+            )
+        else:
+            await db.commit()
+
+    @staticmethod
+    async def _keep_lost_charge(
+        db: AsyncSession, payment: QueuedPayment, result: Tuple[bool, str, str]
+    ) -> None:
+        """
+        Roll back the settlement of an attempt that is no longer in flight,
+        keeping a charge the gateway made meanwhile so it can be refunded
+        """
+        await db.rollback()
+        success, _, transaction_id = result
+        if not success:
+            return
+
+        logger.error(
+            "Payment attempt %s was no longer in flight when charged, transaction %s",
+            payment.attempt_id,
+            transaction_id,
+        )
+        attempt_result = await db.execute(
+            select(PaymentAttempt)
+            .where(PaymentAttempt.id == payment.attempt_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        attempt = attempt_result.scalar_one()
+        attempt.status = PaymentStatus.REFUND_PENDING
+        attempt.message = "Payment was interrupted. The charge will be refunded"
+        attempt.transaction_id = transaction_id
+        await db.commit()
@@ -0,0 +1,308 @@
+import asyncio
+import logging
+from decimal import Decimal
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import engine, run_concurrently
+from app.models import BookSales, Order, OrderItem, OrderStatus, StatCounter, User
+
+logger = logging.getLogger(__name__)
+
+# === Counter keys ===
+USERS_TOTAL = "users.total"
+USERS_ACTIVE = "users.active"
+USERS_BANNED = "users.banned"
+ORDERS_TOTAL = "orders.total"
+ORDERS_REVENUE = "orders.revenue"
+
+# === Not a statistic, bumped on every catalog ===
+# === change and never rebuilt, see BookService ===
+CATALOG_VERSION = "catalog.version"
+
+# === Bumped when orders deduct stock, kept apart ===
+# === so payments don't contend with catalog edits ===
+STOCK_VERSION = "catalog.stock_version"
+
+# === Counters owned by the rollup, recomputed by rebuild ===
+ROLLUP_PREFIXES = ("users.", "orders.")
+
+# === pg advisory lock key, held by the process rebuilding the rollup ===
+REBUILD_LOCK_ID = 7_341_001
+
+
+def orders_status_key(status: OrderStatus) -> str:
+    return f"orders.status.{status.value}"
+
+
+class StatisticsService:
+    """
+    Admin statistics rollup.
+    Writes add their deltas in their own transaction,
+    `read` is two primary key / index lookups,
+    and `rebuild` recomputes everything from the source tables.
+    """
+
+    @staticmethod
+    async def increment(
+        db: AsyncSession, deltas: Mapping[str, Union[int, Decimal]]
+    ) -> None:
+        """
+        Add deltas to counters without committing.
+        Pending changes are flushed first, so the counter rows
+        are locked last and only held until the caller commits.
+        """
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not deltas:
+            return
+
+        await db.flush()
+
+        # === Sorted keys lock counter rows in the same order in every transaction ===
+        stmt = pg_insert(StatCounter).values(
+            [{"key": key, "value": deltas[key]} for key in sorted(deltas)]
+        )
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[StatCounter.key],
+                set_={"value": StatCounter.value + stmt.excluded.value},
+            )
+        )
+
+    @staticmethod
+    async def add_book_sales(db: AsyncSession, quantities: Dict[int, int]) -> None:
+        """Add paid quantities per book without committing, like `increment`"""
+        if not quantities:
+            return
+
+        await db.flush()
+
+        stmt = pg_insert(BookSales).values(
+            [
+                {"book_id": book_id, "total_sold": quantities[book_id]}
+                for book_id in sorted(quantities)
+            ]
+        )
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[BookSales.book_id],
+                set_={"total_sold": BookSales.total_sold + stmt.excluded.total_sold},
+            )
+        )
+
+    @staticmethod
+    async def record_order_created(db: AsyncSession, order: Order) -> None:
+        """Count a new order"""
+        await StatisticsService.increment(db, {
+            ORDERS_TOTAL: 1,
+            orders_status_key(order.status): 1,
+        })
+
+    @staticmethod
+    async def record_status_change(
+        db: AsyncSession,
+        order: Order,
+        old_status: OrderStatus,
+        quantities: Optional[Dict[int, int]] = None,
+    ) -> None:
+        """
+        Move an order between status counters.
+        Becoming PAID adds its revenue and, when given, the sold quantities per book.
+        """
+        if old_status == order.status:
+            return
+
+        deltas: Dict[str, Union[int, Decimal]] = {
+            orders_status_key(old_status): -1,
+            orders_status_key(order.status): 1,
+        }
+        if order.status == OrderStatus.PAID:
+            deltas[ORDERS_REVENUE] = order.total_amount
+            await StatisticsService.add_book_sales(db, quantities or {})
+        await StatisticsService.increment(db, deltas)
+
+    @staticmethod
+    async def record_user_created(db: AsyncSession) -> None:
+        """Count a new user, they start active and not banned"""
+        await StatisticsService.increment(db, {USERS_TOTAL: 1, USERS_ACTIVE: 1})
+
+    @staticmethod
+    async def record_ban(db: AsyncSession, banned: bool) -> None:
+        """Count a ban or an unban"""
+        await StatisticsService.increment(db, {USERS_BANNED: 1 if banned else -1})
+
+    @staticmethod
+    async def read(
+        session_factory: Optional[async_sessionmaker] = None,
+    ) -> Dict[str, Any]:
+        """
+        Get admin statistics from the rollup,
+        counters and top books are read concurrently.
+
+        :param session_factory: sessions to read with, defaults to the primary
+        """
+        counters, top_books = await run_concurrently(
+            StatisticsService._read_counters,
+            StatisticsService._read_top_books,
+            session_factory=session_factory,
+        )
+
+        return {
+            "users": {
+                "total": int(counters.get(USERS_TOTAL, 0)),
+                "active": int(counters.get(USERS_ACTIVE, 0)),
+                "banned": int(counters.get(USERS_BANNED, 0)),
+            },
+            "orders": {
+                "total_orders": int(counters.get(ORDERS_TOTAL, 0)),
+                "total_revenue": counters.get(ORDERS_REVENUE, Decimal("0.00")),
+                "order_by_status": {
+                    status.value: int(counters[orders_status_key(status)])
+                    for status in OrderStatus
+                    if counters.get(orders_status_key(status))
+                },
+                "top_books": top_books,
+            },
+        }
+
+    @staticmethod
+    async def _read_counters(db: AsyncSession) -> Dict[str, Decimal]:
+        result = await db.execute(select(StatCounter.key, StatCounter.value))
+        return {key: value for key, value in result}
+
+    @staticmethod
+    async def _read_top_books(db: AsyncSession) -> List[Dict[str, int]]:
+        result = await db.execute(
+            select(BookSales.book_id, BookSales.total_sold)
+            .where(BookSales.total_sold > 0)
+            .order_by(BookSales.total_sold.desc(), BookSales.book_id)
+            .limit(5)
+        )
+        return [
+            {"book_id": book_id, "total_sold": total_sold}
+            for book_id, total_sold in result
+        ]
+
+    @staticmethod
+    async def rebuild() -> bool:
+        """
+        Recompute the rollup from orders, order
+        items and users and correct the counters.
+        Writers are never blocked: the rollup and the
+        source tables are read from one snapshot,
+        and the difference is then added like any other delta.
+        Only one process rebuilds at a time, others skip.
+
+        :return: False if another process was rebuilding
+        """
+        # === The advisory lock belongs to the connection, ===
+        # === so keep one for both transactions ===
+        async with engine.connect() as conn:
+            async with AsyncSession(bind=conn, expire_on_commit=False) as db:
+                result = await db.execute(
+                    select(func.pg_try_advisory_lock(REBUILD_LOCK_ID))
+                )
+                locked = result.scalar_one()
+                await db.commit()
+                if not locked:
+                    return False
+
+                try:
+                    counter_deltas, sales_deltas = await StatisticsService._drift(db)
+                    await db.commit()
+
+                    # === Writes after the snapshot added their ===
+                    # === own deltas, so adding the drift is exact ===
+                    await StatisticsService.increment(db, counter_deltas)
+                    await StatisticsService.add_book_sales(db, sales_deltas)
+                    await db.commit()
+                finally:
+                    await db.execute(select(func.pg_advisory_unlock(REBUILD_LOCK_ID)))
+                    await db.commit()
+        return True
+
+    @staticmethod
+    async def _drift(
+        db: AsyncSession,
+    ) -> Tuple[Dict[str, Union[int, Decimal]], Dict[int, int]]:
+        """Get how far counters and book sales are off, read from a single snapshot"""
+        await db.execute(
+            text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        )
+
+        expected: Dict[str, Union[int, Decimal]] = {}
+
+        users_result = await db.execute(
+            select(
+                func.count(User.id),
+                func.count(User.id).filter(User.is_active == True),
+                func.count(User.id).filter(User.is_banned == True),
+            )
+        )
+        expected[USERS_TOTAL], expected[USERS_ACTIVE], expected[USERS_BANNED] = (
+            users_result.one()
+        )
+
+        status_result = await db.execute(
+            select(
+                Order.status, func.count(Order.id), func.sum(Order.total_amount)
+            ).group_by(Order.status)
+        )
+        expected[ORDERS_TOTAL] = 0
+        expected[ORDERS_REVENUE] = Decimal("0.00")
+        for status, count, amount in status_result:
+            expected[orders_status_key(status)] = count
+            expected[ORDERS_TOTAL] += count
+            if status == OrderStatus.PAID:
+                expected[ORDERS_REVENUE] = amount
+
+        current = {
+            key: value
+            for key, value in (await StatisticsService._read_counters(db)).items()
+            if key.startswith(ROLLUP_PREFIXES)
+        }
+        counter_deltas = {
+            key: expected.get(key, 0) - current.get(key, 0)
+            for key in expected.keys() | current.keys()
+        }
+
+        sales_result = await db.execute(
+            select(OrderItem.book_id, func.sum(OrderItem.quantity))
+            .join(Order)
+            .where(Order.status == OrderStatus.PAID)
+            .group_by(OrderItem.book_id)
+        )
+        expected_sales: Dict[int, int] = {
+            book_id: int(sold) for book_id, sold in sales_result
+        }
+        current_sales_result = await db.execute(
+            select(BookSales.book_id, BookSales.total_sold)
+        )
+        current_sales: Dict[int, int] = {
+            book_id: sold for book_id, sold in current_sales_result
+        }
+        sales_deltas = {
+            book_id: expected_sales.get(book_id, 0) - current_sales.get(book_id, 0)
+            for book_id in expected_sales.keys() | current_sales.keys()
+        }
+        return counter_deltas, {
+            book_id: delta for book_id, delta in sales_deltas.items() if delta
+        }
+
+    @staticmethod
+    async def reconcile_forever(interval: int) -> None:
+        """
+        Rebuild the rollup now and then every `interval` seconds (once if interval is 0)
+        """
+        while True:
+            try:
+                await StatisticsService.rebuild()
+            except Exception:
+                logger.exception("Statistics rollup reconciliation failed")
+
+            if interval <= 0:
+                return
+            await asyncio.sleep(interval)
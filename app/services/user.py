@@ -1,12 +1,19 @@
-from typing import Optional
+from typing import Any, List, Optional, Sequence
 
 from pydantic import EmailStr
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models import User
+from app.services.statistics import StatisticsService
+from app.utils.fields import select_columns
+from app.utils.pagination import Keyset, keyset_page
 from app.schemas import UserCreate, UserUpdate
-from app.core import get_password_hash, verify_password
+from app.core import (
+    get_password_hash_async,
+    invalidate_principal,
+    verify_password_async,
+)
 
 
 class UserService:
@@ -34,10 +41,31 @@ class UserService:
         )
         return result.scalar_one_or_none()
 
+    @staticmethod
+    async def get_multi(
+        db: AsyncSession,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[Keyset] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Any]:
+        """
+        Get multiple users in descending order, by offset or after a keyset cursor.
+        With `fields` only those columns are selected
+        and rows are returned instead of users.
+        """
+        query = (
+            select(User) if fields is None else select(*select_columns(User, fields))
+        )
+        result = await db.execute(
+            keyset_page(query, User.created_at, User.id, skip, limit, after)
+        )
+        return list(result.scalars().all() if fields is None else result.all())
+
     @staticmethod
     async def create(db: AsyncSession, user_create: UserCreate) -> User:
         """Create a new user"""
-        hashed_password = get_password_hash(user_create.password)
+        hashed_password = await get_password_hash_async(user_create.password)
 
         user = User(
             email = user_create.email,
@@ -47,6 +75,7 @@ class UserService:
         )
 
         db.add(user)
+        await StatisticsService.record_user_created(db)
         await db.commit()
         await db.refresh(user)
         return user
@@ -57,15 +86,18 @@ class UserService:
         update_data = user_update.model_dump(exclude_unset=True)
 
         if "password" in update_data:
-            hashed_password = get_password_hash(update_data["password"])
+            hashed_password = await get_password_hash_async(update_data["password"])
             del update_data["password"]
             update_data["hashed_password"] = hashed_password
 
+        username = user.username
         for field, value in update_data.items():
             setattr(user, field, value)
 
         await db.commit()
         await db.refresh(user)
+
+        invalidate_principal(username)
         return user
 
     @staticmethod
@@ -74,7 +106,7 @@ class UserService:
         user = await UserService.get_by_username(db, username)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        if not await verify_password_async(password, user.hashed_password):
             return None
         return user
 
@@ -82,16 +114,22 @@ class UserService:
     async def ban(db: AsyncSession, user: User) -> Optional[User]:
         """Ban user"""
         user.is_banned = True # TODO: In future, add ban_counts, and implement incremental logic
+        await StatisticsService.record_ban(db, banned=True)
         await db.commit()
         await db.refresh(user)
+
+        invalidate_principal(user.username)
         return user
 
     @staticmethod
     async def unban(db: AsyncSession, user: User) -> Optional[User]:
         """Unban user"""
         user.is_banned = False
+        await StatisticsService.record_ban(db, banned=False)
         await db.commit()
         await db.refresh(user)
+
+        invalidate_principal(user.username)
         return user
 
 
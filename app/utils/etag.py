@@ -0,0 +1,48 @@
+from typing import Any, Dict, Optional
+
+from fastapi import Response, status
+
+from app.config import settings
+
+
+def make_etag(*parts: Any) -> str:
+    """Make a strong ETag from values identifying one version of a representation"""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag, weak tags match too as RFC 9110 asks
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    """Get ETag and Cache-Control headers of a public catalog response"""
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.CATALOG_CACHE_MAX_AGE}",
+    }
+
+
+def not_modified(etag: str) -> Response:
+    """Get an empty 304 response telling the client its copy is still current"""
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag)
+    )
+
+
+def with_cache_headers(result: Any, response: Response, etag: str) -> Any:
+    """
+    Set caching headers of a handler result.
+    A returned Response gets them itself, for returned
+    content they go on the injected response.
+    """
+    target = result if isinstance(result, Response) else response
+    target.headers.update(cache_headers(etag))
+    return result
@@ -0,0 +1,104 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type, Union, cast
+
+from fastapi import Response
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+from sqlalchemy import inspect
+
+
+def allowed_fields(schema: Type[BaseModel], model: Any) -> List[str]:
+    """
+    Get fields of a schema that are plain columns
+    of the model, the ones a client can pick
+    """
+    columns = {attr.key for attr in inspect(model).column_attrs}
+    return [name for name in schema.model_fields if name in columns]
+
+
+def parse_fields(fields: str, allowed: Sequence[str]) -> List[str]:
+    """
+    Parse a comma separated `fields` query value.
+    Raise ValueError naming unknown fields.
+    """
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in allowed]
+    if unknown or not requested:
+        raise ValueError(
+            f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return requested
+
+
+def select_columns(model: Any, fields: Sequence[str]) -> List[Any]:
+    """
+    Get columns to SELECT for the fields, plus
+    the (created_at, id) keyset used for paging
+    """
+    names = list(dict.fromkeys([*fields, "created_at", "id"]))
+    return [getattr(model, name) for name in names]
+
+
+@lru_cache(maxsize=256)
+def slim_model(schema: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """Build a response model with only the given fields of a schema"""
+    definitions: Dict[str, Any] = {
+        name: (schema.model_fields[name].annotation, ...) for name in fields
+    }
+    return create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **definitions,
+    )
+
+
+def _list_of(item_model: Type[BaseModel]) -> Any:
+    """List[item_model] of a model built at runtime, which has no static type to name"""
+    return cast(Any, List)[item_model]
+
+
+@lru_cache(maxsize=256)
+def slim_list_model(
+    list_schema: Type[BaseModel],
+    items_key: str,
+    item_schema: Type[BaseModel],
+    fields: Tuple[str, ...],
+) -> Type[BaseModel]:
+    """Build a list response model whose items only have the given fields"""
+    definitions: Dict[str, Any] = {
+        items_key: (_list_of(slim_model(item_schema, fields)), ...)
+    }
+    return create_model(
+        f"{list_schema.__name__}Fields", __base__=list_schema, **definitions
+    )
+
+
+@lru_cache(maxsize=256)
+def slim_items_adapter(
+    item_schema: Type[BaseModel], fields: Tuple[str, ...]
+) -> TypeAdapter:
+    """Build an adapter for a bare list of items with only the given fields"""
+    return TypeAdapter(_list_of(slim_model(item_schema, fields)))
+
+
+def sparse_response(
+    item_schema: Type[BaseModel],
+    fields: Sequence[str],
+    content: Any,
+    list_schema: Optional[Type[BaseModel]] = None,
+    items_key: str = "items",
+) -> Response:
+    """
+    Serialize a response whose items only have the requested fields.
+    Returns a Response, so FastAPI skips validating it against the full response_model.
+
+    :param content: a bare list of items, or the
+        list_schema content with items under items_key
+    """
+    body: Union[bytes, str]
+    if list_schema is None:
+        adapter = slim_items_adapter(item_schema, tuple(fields))
+        body = adapter.dump_json(adapter.validate_python(content))
+    else:
+        model = slim_list_model(list_schema, items_key, item_schema, tuple(fields))
+        body = model.model_validate(content).model_dump_json()
+    return Response(content=body, media_type="application/json")
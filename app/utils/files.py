@@ -0,0 +1,113 @@
+import os
+from email.utils import formatdate
+from typing import Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+ByteRange = Tuple[int, int]
+
+
+def parse_range(header: str, size: int) -> Optional[ByteRange]:
+    """
+    Parse a `Range: bytes=...` header into an inclusive (start, end) range of a file.
+    Malformed headers and multiple ranges give None,
+    the whole file is served then as RFC 9110 allows.
+
+    :raises ValueError: the range is past the end of the file
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first.isdigit() or last.isdigit()):
+        return None
+    if first and last and not (first.isdigit() and last.isdigit()):
+        return None
+
+    if not first:
+        # === Suffix range, the last N bytes ===
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+class RangeFileResponse(FileResponse):
+    """
+    FileResponse serving the whole file or one byte range of it.
+    The body is read in a worker thread in big chunks.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        stat_result: os.stat_result,
+        headers: Optional[Mapping[str, str]] = None,
+        byte_range: Optional[ByteRange] = None,
+        media_type: Optional[str] = None,
+    ):
+        self.byte_range = byte_range
+        self.file_size = stat_result.st_size
+        super().__init__(
+            path,
+            status_code=206 if byte_range else 200,
+            headers=headers,
+            media_type=media_type,
+            stat_result=stat_result,
+        )
+
+    def set_stat_headers(self, stat_result: os.stat_result) -> None:
+        size = stat_result.st_size
+        self.headers.setdefault("accept-ranges", "bytes")
+        self.headers.setdefault(
+            "last-modified", formatdate(stat_result.st_mtime, usegmt=True)
+        )
+        if self.byte_range is None:
+            self.headers["content-length"] = str(size)
+        else:
+            start, end = self.byte_range
+            self.headers["content-length"] = str(end - start + 1)
+            self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+
+        start, end = self.byte_range or (0, self.file_size - 1)
+        count = end - start + 1
+
+        if scope["method"].upper() == "HEAD" or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(start)
+                remaining = count
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    remaining = remaining - len(chunk) if chunk else 0
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": chunk,
+                            "more_body": remaining > 0,
+                        }
+                    )
+
+        if self.background is not None:
+            await self.background()
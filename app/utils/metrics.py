@@ -0,0 +1,95 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Union
+
+
+class Metric(NamedTuple):
+    name: str
+    kind: str  # === gauge | counter ===
+    help: str
+    value: Union[int, float]
+    labels: Optional[Dict[str, str]] = None
+
+
+# === Pool stats exported as metrics: stats key -> (kind, help) ===
+POOL_METRICS = {
+    "pool_size": ("gauge", "Connections kept open by the pool"),
+    "max_overflow": ("gauge", "Extra connections the pool may open under load"),
+    "checked_out": ("gauge", "Connections in use"),
+    "checked_in": ("gauge", "Idle connections in the pool"),
+    "overflow": ("gauge", "Extra connections currently open"),
+    "checkouts": ("counter", "Connections handed out"),
+    "timeouts": ("counter", "Checkouts that gave up waiting for a connection"),
+    "wait_seconds_total": ("counter", "Seconds spent getting connections"),
+    "wait_seconds_max": ("gauge", "Longest time spent getting a connection"),
+}
+
+# === Cache stats exported as metrics ===
+CACHE_METRICS = {
+    "size": ("gauge", "Entries in the cache"),
+    "hits": ("counter", "Cache hits"),
+    "misses": ("counter", "Cache misses"),
+    "evictions": ("counter", "Entries dropped because the cache was full"),
+    "expirations": ("counter", "Entries dropped because they expired"),
+}
+
+
+def pool_metrics(stats: Dict[str, Union[int, float]], engine: str) -> List[Metric]:
+    """Turn InstrumentedPool.stats of an engine into metrics"""
+    return [
+        Metric(
+            _name("bookstore_db_pool", key, kind),
+            kind,
+            help,
+            stats[key],
+            {"engine": engine},
+        )
+        for key, (kind, help) in POOL_METRICS.items()
+    ]
+
+
+def cache_metrics(stats: Dict[str, int], cache: str) -> List[Metric]:
+    """Turn TTLCache.stats of a cache into metrics"""
+    return [
+        Metric(
+            _name("bookstore_cache", key, kind),
+            kind,
+            help,
+            stats[key],
+            {"cache": cache},
+        )
+        for key, (kind, help) in CACHE_METRICS.items()
+    ]
+
+
+def render_prometheus(metrics: Iterable[Metric]) -> str:
+    """
+    Render metrics in the Prometheus text exposition format, HELP and TYPE once per name
+    """
+    lines: List[str] = []
+    described = set()
+
+    for metric in metrics:
+        if metric.name not in described:
+            described.add(metric.name)
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+
+        labels = ""
+        if metric.labels:
+            pairs = ",".join(
+                f'{key}="{_escape(value)}"' for key, value in metric.labels.items()
+            )
+            labels = "{" + pairs + "}"
+        lines.append(f"{metric.name}{labels} {metric.value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _name(prefix: str, key: str, kind: str) -> str:
+    # === Counters are suffixed with _total by convention ===
+    if kind == "counter" and not key.endswith("_total"):
+        return f"{prefix}_{key}_total"
+    return f"{prefix}_{key}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
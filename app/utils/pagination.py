@@ -0,0 +1,122 @@
+import json
+import base64
+import binascii
+from decimal import Decimal
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.sql import Select
+
+
+# === Keyset position of a row: (created_at, id) ===
+Keyset = Tuple[datetime, int]
+
+# === Keyset position of a search hit: (rank, id) ===
+RankKeyset = Tuple[float, int]
+
+
+def _encode(values: Sequence[Any]) -> str:
+    payload = json.dumps(list(values), separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> Any:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def encode_cursor(sort_value: Any, row_id: int, sort: Optional[str] = None) -> str:
+    """
+    Encode the keyset of the last row of a page into an opaque cursor.
+    `sort_value` is usually created_at, datetimes and decimals are encoded as strings.
+
+    :param sort: name of the sort order, for lists sorted in several orders
+    """
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    elif isinstance(sort_value, Decimal):
+        sort_value = str(sort_value)
+    if sort is None:
+        return _encode([sort_value, row_id])
+    return _encode([sort, sort_value, row_id])
+
+
+def decode_cursor(
+    cursor: str,
+    parse: Callable[[Any], Any] = datetime.fromisoformat,
+    sort: Optional[str] = None,
+) -> Optional[Tuple[Any, int]]:
+    """
+    Decode a cursor made by encode_cursor, return None if it is malformed.
+
+    :param parse: reads the sort value back, by default a created_at datetime
+    :param sort: name of the sort order, a cursor made for another one is malformed
+    """
+    try:
+        if sort is None:
+            sort_value, row_id = _decode(cursor)
+        else:
+            cursor_sort, sort_value, row_id = _decode(cursor)
+            if cursor_sort != sort:
+                return None
+        return parse(sort_value), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, ArithmeticError):
+        return None
+
+
+def encode_rank_cursor(rank: float, row_id: int) -> str:
+    """Encode the rank keyset of the last hit of a search page into an opaque cursor"""
+    return _encode([rank, row_id])
+
+
+def decode_rank_cursor(cursor: str) -> Optional[RankKeyset]:
+    """Decode a cursor made by encode_rank_cursor, return None if it is malformed"""
+    try:
+        rank, row_id = _decode(cursor)
+        return float(rank), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+
+
+def keyset_page(
+    query: Select,
+    sort_column: Any,
+    id_column: Any,
+    skip: int,
+    limit: int,
+    after: Optional[Tuple[Any, int]] = None,
+    descending: bool = True,
+) -> Select:
+    """
+    Page a query by (sort_column, id), newest first when sorting by created_at.
+    With `after` it seeks past the given keyset, otherwise it falls back to OFFSET.
+    """
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc()).limit(limit)
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc()).limit(limit)
+
+    if after is None:
+        return query.offset(skip)
+    keyset = tuple_(sort_column, id_column)
+    return query.where(keyset < after if descending else keyset > after)
+
+
+def split_page(
+    rows: Sequence[Any], limit: int, cursor_of: Optional[Callable[[Any], str]] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Split rows fetched with limit + 1 into the page and a cursor of the next page.
+    The cursor is None on the last page.
+
+    :param cursor_of: makes the cursor from the last
+        row, by default from its (created_at, id)
+    """
+    page = list(rows[:limit])
+    if len(rows) <= limit:
+        return page, None
+    last = page[-1]
+    if cursor_of is not None:
+        return page, cursor_of(last)
+    return page, encode_cursor(last.created_at, last.id)
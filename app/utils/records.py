@@ -0,0 +1,175 @@
+import io
+import csv
+import json
+import codecs
+from enum import Enum
+from collections import deque
+from decimal import Decimal
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+# === A record and the line it starts on, or an error message instead of the record ===
+Record = Tuple[int, Union[Dict[str, Any], str]]
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into text lines, only one partial line is kept in memory"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    tail = ""
+    async for chunk in chunks:
+        *lines, tail = (tail + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def iter_ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """
+    Parse newline delimited JSON objects from a byte stream, blank lines are skipped
+    """
+    line_no = 0
+    async for line in _iter_lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, "Expected a JSON object"
+            continue
+        yield line_no, record
+
+
+class _NeedMore(Exception):
+    """csv.reader asked for a line that hasn't been read from the stream yet"""
+
+
+class _LineFeed:
+    """
+    Lines for csv.reader, filled from an async stream.
+    The lines of the record being parsed are kept,
+    to feed them again once more lines arrived.
+    """
+
+    def __init__(self) -> None:
+        self.lines: Deque[str] = deque()
+        self.record: List[str] = []
+        self.record_length = 0
+        self.eof = False
+
+    def __iter__(self) -> "_LineFeed":
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            if self.eof:
+                raise StopIteration
+            raise _NeedMore()
+        line = self.lines.popleft()
+        self.record.append(line)
+        self.record_length += len(line)
+        return line
+
+    def start_record(self) -> None:
+        self.record = []
+        self.record_length = 0
+
+    def rewind(self) -> None:
+        self.lines.extendleft(reversed(self.record))
+        self.start_record()
+
+
+async def iter_csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """
+    Parse CSV rows with a header from a byte stream, as dicts of column name to value.
+    Rows are parsed by csv.reader, quoted values may span lines;
+    a record longer than csv.field_size_limit()
+    is reported and skipped instead of buffered.
+    """
+    header: Optional[List[str]] = None
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    lines = _iter_lines(chunks).__aiter__()
+    line_no = 0
+
+    while True:
+        feed.start_record()
+        start = line_no + 1
+        try:
+            row = next(reader)
+        except _NeedMore:
+            # === Parse the record again with one more ===
+            # === line, unless it's grown too long ===
+            if feed.record_length > csv.field_size_limit():
+                line_no += len(feed.record)
+                feed.start_record()
+                yield start, "Invalid CSV: record too long or unterminated quoted value"
+                continue
+            feed.rewind()
+            try:
+                feed.lines.append(await lines.__anext__() + "\n")
+            except StopAsyncIteration:
+                feed.eof = True
+            continue
+        except StopIteration:
+            return
+        except csv.Error as e:
+            line_no += len(feed.record)
+            yield start, f"Invalid CSV: {e}"
+            continue
+
+        line_no += len(feed.record)
+        if not any(cell.strip() for cell in row):
+            continue
+        if header is None:
+            header = [name.strip() for name in row]
+            continue
+        if len(row) != len(header):
+            yield start, f"Expected {len(header)} columns, got {len(row)}"
+            continue
+        yield start, dict(zip(header, row))
+
+
+def _plain(value: Any) -> Any:
+    """
+    Get a value as written to CSV / JSON: decimals
+    and datetimes as strings, enums as their value
+    """
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_csv_rows(rows: Sequence[Sequence[Any]]) -> bytes:
+    """Encode rows (a header is just a row) as CSV lines"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([[_plain(value) for value in row] for row in rows])
+    return buffer.getvalue().encode()
+
+
+def encode_ndjson_rows(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> bytes:
+    """Encode rows as newline delimited JSON objects keyed by column name"""
+    return "".join(
+        json.dumps({name: _plain(value) for name, value in zip(columns, row)}) + "\n"
+        for row in rows
+    ).encode()
@@ -0,0 +1,168 @@
+"""
+Benchmark of book search on a synthetic catalog,
+against a plain ILIKE scan of the same words.
+Generated books are marked by their description
+and deleted afterwards unless --keep is given,
+run it against a scratch database: it needs the schema migrated, pg_trgm included.
+
+Usage: python -m scripts.bench_search [--books N] [--repeat N] [--keep]
+"""
+import time
+import asyncio
+import argparse
+import statistics
+from typing import Awaitable, Callable, List
+
+from sqlalchemy import delete, func, select, text
+
+from app.database import AsyncSessionLocal, engine
+from app.models import Book
+from app.services import BookService
+
+MARKER = "bench-search:"
+
+WORDS = [
+    "dragon",
+    "kingdom",
+    "ocean",
+    "garden",
+    "history",
+    "shadow",
+    "winter",
+    "river",
+    "empire",
+    "silver",
+    "forest",
+    "island",
+    "midnight",
+    "journey",
+    "secret",
+    "machine",
+    "harbor",
+    "desert",
+    "storm",
+    "letters",
+]
+
+# === Exact words, phrases and misspelled titles ===
+QUERIES = [
+    "dragon",
+    "ocean garden",
+    "history of the empire",
+    "dragn kingdm",
+    "midnigth harbor",
+]
+
+
+async def generate(books: int) -> None:
+    """
+    Insert synthetic books server side, titles and descriptions are drawn from WORDS
+    """
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            text(
+                """
+                INSERT INTO books
+                    (title, description, price, stock_quantity, created_at, updated_at)
+                SELECT
+                    initcap(
+                        w[1 + i % 20] || ' ' || w[1 + (i / 20) % 20] || ' '
+                        || w[1 + (i / 400) % 20]
+                    ) || ' ' || i,
+                    :marker || ' a story of the ' || w[1 + (i * 7) % 20]
+                        || ' and the ' || w[1 + (i * 13) % 20],
+                    (5 + i % 50)::numeric(10, 2),
+                    i % 7,
+                    now() - make_interval(secs => i),
+                    now()
+                FROM generate_series(1, :books) AS i,
+                    (SELECT CAST(:words AS text[]) AS w) AS words
+                """
+            ),
+            {"books": books, "marker": MARKER, "words": WORDS},
+        )
+        await db.commit()
+        await db.execute(text("ANALYZE books"))
+        await db.commit()
+
+
+async def cleanup() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Book).where(Book.description.startswith(MARKER)))
+        await db.commit()
+
+
+async def measure(run: Callable[[], Awaitable[int]], repeat: int) -> List[float]:
+    """
+    Run a query `repeat` times after one warm up run, return the timings in milliseconds
+    """
+    await run()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+async def main(books: int, repeat: int, keep: bool) -> None:
+    print(f"Generating {books} books...")
+    start = time.perf_counter()
+    await generate(books)
+    print(f"Generated in {time.perf_counter() - start:.1f} s\n")
+
+    try:
+        print(
+            f"{'query':<24} {'hits':>5} {'search ms':>10} "
+            f"{'ilike ms':>10} {'ilike hits':>10}"
+        )
+        for q in QUERIES:
+            async with AsyncSessionLocal() as db:
+
+                async def search() -> int:
+                    return len(await BookService.search(db, q, limit=20))
+
+                async def ilike() -> int:
+                    # === Substring match of every word over the ===
+                    # === whole catalog, without ranking or typos ===
+                    conditions = [
+                        Book.title.ilike(f"%{word}%")
+                        | Book.description.ilike(f"%{word}%")
+                        for word in q.split()
+                    ]
+                    result = await db.execute(
+                        select(func.count(Book.id)).where(*conditions)
+                    )
+                    return result.scalar_one()
+
+                hits = await search()
+                search_ms = statistics.median(await measure(search, repeat))
+                ilike_hits = await ilike()
+                ilike_ms = statistics.median(await measure(ilike, repeat))
+            print(
+                f"{q:<24} {hits:>5} {search_ms:>10.2f} "
+                f"{ilike_ms:>10.2f} {ilike_hits:>10}"
+            )
+    finally:
+        if not keep:
+            await cleanup()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark book search on a synthetic catalog"
+    )
+    parser.add_argument(
+        "--books", type=int, default=1_000_000, help="synthetic books to generate"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="timed runs per query, the median is shown",
+    )
+    parser.add_argument("--keep", action="store_true", help="keep the generated books")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.books, args.repeat, args.keep))
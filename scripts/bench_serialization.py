@@ -0,0 +1,132 @@
+"""
+Benchmark of rendering a 100-order OrderList: FastAPI's
+response_model path against the fast JSON path.
+No database is needed, orders are built in memory with their items, books and buyer.
+
+Usage: python -m scripts.bench_serialization [--orders N] [--number N]
+"""
+import json
+import asyncio
+import argparse
+import timeit
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.config import settings
+from app.models import Book, Order, OrderItem, OrderStatus, User
+from app.schemas import OrderList
+from app.utils.responses import render
+
+
+def build_content(orders: int) -> Dict[str, Any]:
+    """An OrderList page of orders with three items each, as handlers return it"""
+    now = datetime.utcnow()
+    user = User(
+        id=1,
+        email="reader@example.com",
+        username="reader",
+        full_name="Reader",
+        hashed_password="x",
+        is_active=True,
+        is_superuser=False,
+        is_banned=False,
+        created_at=now,
+        updated_at=now,
+    )
+    books = [
+        Book(
+            id=i,
+            title=f"Book {i}",
+            description="d" * 200,
+            price=Decimal("12.50"),
+            image_url=None,
+            stock_quantity=3,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(3)
+    ]
+
+    page = []
+    for i in range(orders):
+        order = Order(
+            id=i,
+            user_id=user.id,
+            status=OrderStatus.PAID,
+            total_amount=Decimal("37.50"),
+            payment_card_number=None,
+            created_at=now,
+            updated_at=now,
+        )
+        order.user = user
+        order.items = [
+            OrderItem(
+                id=i * 3 + j,
+                order_id=i,
+                book_id=book.id,
+                quantity=1,
+                price=book.price,
+                book=book,
+            )
+            for j, book in enumerate(books)
+        ]
+        page.append(order)
+
+    return {
+        "orders": page,
+        "total": orders,
+        "total_exact": True,
+        "page": 1,
+        "per_page": orders,
+        "pages": 1,
+        "next_cursor": None,
+    }
+
+
+def main(orders: int, number: int) -> None:
+    content = build_content(orders)
+    field = create_response_field(name="response", type_=OrderList)
+    loop = asyncio.new_event_loop()
+
+    def current() -> bytes:
+        # === What FastAPI does with response_model: ===
+        # === validate, dump to python, then json.dumps ===
+        value = loop.run_until_complete(
+            serialize_response(field=field, response_content=content, is_coroutine=True)
+        )
+        return JSONResponse(value).body
+
+    def fast() -> bytes:
+        return render(OrderList, content).body
+
+    settings.FAST_JSON_RESPONSES = True
+    assert json.loads(current()) == json.loads(
+        fast()
+    ), "both paths must render the same JSON"
+
+    current_ms = timeit.timeit(current, number=number) / number * 1000
+    fast_ms = timeit.timeit(fast, number=number) / number * 1000
+    print(f"OrderList of {orders} orders, {len(fast())} bytes")
+    print(f"response_model: {current_ms:8.2f} ms")
+    print(f"fast path:      {fast_ms:8.2f} ms")
+    print(f"speedup:        {current_ms / fast_ms:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the response_model and fast JSON rendering paths"
+    )
+    parser.add_argument(
+        "--orders", type=int, default=100, help="orders in the rendered page"
+    )
+    parser.add_argument(
+        "--number", type=int, default=200, help="renders per measurement"
+    )
+    args = parser.parse_args()
+
+    main(args.orders, args.number)
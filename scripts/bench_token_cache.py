@@ -0,0 +1,42 @@
+"""
+Micro-benchmark of access token verification, with and without the verified token cache.
+
+Usage: python -m scripts.bench_token_cache [--number N]
+"""
+import argparse
+import timeit
+
+from app.core.security import create_access_token, token_cache, verify_access_token
+
+
+def main(number: int) -> None:
+    token = create_access_token("bench-user")
+
+    def uncached() -> None:
+        token_cache.clear()
+        verify_access_token(token)
+
+    def cached() -> None:
+        verify_access_token(token)
+
+    # === Warm up and fill the cache ===
+    uncached()
+    cached()
+
+    uncached_us = timeit.timeit(uncached, number=number) / number * 1e6
+    cached_us = timeit.timeit(cached, number=number) / number * 1e6
+    print(f"uncached: {uncached_us:8.2f} us per verification")
+    print(f"cached:   {cached_us:8.2f} us per verification")
+    print(f"speedup:  {uncached_us / cached_us:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare cached and uncached access token verification"
+    )
+    parser.add_argument(
+        "--number", type=int, default=20_000, help="verifications per measurement"
+    )
+    args = parser.parse_args()
+
+    main(args.number)
@@ -0,0 +1,150 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, select
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.database import Base
+from app.models import Book, Order, OrderItem, OrderStatus, User
+from app.services.loaders import LoadProfile
+
+# === Relationship paths each load profile loads, and the model it is used on ===
+PROFILES = {
+    "CATALOG": (Book, set()),
+    "ORDER": (Order, set()),
+    "ORDER_ITEMS": (Order, {("items",)}),
+    "ORDER_DETAIL": (Order, {("items",), ("items", "book"), ("user",)}),
+    "ADMIN_ORDERS": (Order, {("items",), ("items", "book"), ("user",)}),
+}
+
+
+@compiles(TSVECTOR, "sqlite")
+def compile_tsvector(type_, compiler, **kw):
+    return "TEXT"
+
+
+@pytest.fixture(scope="module")
+def engine():
+    """In-memory SQLite database with one order of one book"""
+    engine = create_engine("sqlite://")
+
+    # === Stand-ins for the functions of the search_vector column ===
+    @event.listens_for(engine, "connect")
+    def create_functions(connection, _):
+        connection.create_function(
+            "to_tsvector", 2, lambda config, value: value, deterministic=True
+        )
+        connection.create_function(
+            "setweight", 2, lambda vector, weight: vector, deterministic=True
+        )
+
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        book = Book(title="Book", price=Decimal("10.00"))
+        user = User(
+            email="user@example.com",
+            username="user",
+            full_name="User",
+            hashed_password="hash",
+        )
+        session.add(
+            Order(
+                user=user,
+                status=OrderStatus.PENDING,
+                total_amount=Decimal("10.00"),
+                items=[OrderItem(book=book, quantity=1, price=Decimal("10.00"))],
+            )
+        )
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+def persistent(instance):
+    """
+    Attach an instance to a session as if it was
+    loaded by a query without relationship options
+    """
+    make_transient_to_detached(instance)
+    session = Session()
+    session.add(instance)
+    return instance
+
+
+def loaded_paths(instance, path=(), seen=None):
+    """Paths of the relationships loaded on an instance and on what they hold"""
+    seen = set() if seen is None else seen
+    seen.add(id(instance))
+    state = inspect(instance)
+    paths = set()
+    for relationship in state.mapper.relationships:
+        if relationship.key in state.unloaded:
+            continue
+        paths.add(path + (relationship.key,))
+        value = state.attrs[relationship.key].loaded_value
+        for related in value if relationship.uselist else [value]:
+            if related is not None and id(related) not in seen:
+                paths |= loaded_paths(related, path + (relationship.key,), seen)
+    return paths
+
+
+def test_every_profile_is_checked():
+    profiles = {name for name in vars(LoadProfile) if name.isupper()}
+    assert profiles == set(PROFILES)
+
+
+@pytest.mark.parametrize("name", sorted(PROFILES))
+def test_profile_loads_only_its_relationships(engine, name):
+    model, expected = PROFILES[name]
+    with Session(engine) as session:
+        query = select(model).options(*getattr(LoadProfile, name))
+        instance = session.execute(query).scalars().one()
+        assert loaded_paths(instance) == expected
+
+
+def test_relationships_are_lazy_raise():
+    for mapper in Base.registry.mappers:
+        for relationship in mapper.relationships:
+            assert relationship.lazy == "raise", f"{relationship} loads lazily"
+
+
+@pytest.mark.parametrize(
+    "instance, attribute",
+    [
+        (
+            Order(
+                id=1,
+                user_id=1,
+                status=OrderStatus.PENDING,
+                total_amount=Decimal("10.00"),
+            ),
+            "items",
+        ),
+        (
+            Order(
+                id=1,
+                user_id=1,
+                status=OrderStatus.PENDING,
+                total_amount=Decimal("10.00"),
+            ),
+            "user",
+        ),
+        (
+            OrderItem(id=1, order_id=1, book_id=1, quantity=1, price=Decimal("10.00")),
+            "book",
+        ),
+        (
+            OrderItem(id=1, order_id=1, book_id=1, quantity=1, price=Decimal("10.00")),
+            "order",
+        ),
+        (Book(id=1, title="Book", price=Decimal("10.00")), "order_items"),
+        (User(id=1, email="user@example.com", username="user"), "orders"),
+    ],
+)
+def test_unrequested_relationship_load_raises(instance, attribute):
+    instance = persistent(instance)
+    with pytest.raises(InvalidRequestError, match="lazy='raise'"):
+        getattr(instance, attribute)